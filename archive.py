@@ -0,0 +1,154 @@
+import glob
+import os
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+from dateutil import parser
+from database import migrate, assign_guilds
+
+# Check-ins of classes that ended more than `after_days` ago move out of classes.db into one archive
+# database per term (archive/classes-<term>.db), so the live checkins table, its indexes and the
+# rollups only cover running classes. A term is the class's "term" from the config, or the year and
+# month of its end_date. Only rows inside the class's start_date..end_date move, so a channel
+# reused for a later class keeps its new rows. Archived rows stay queryable: connect_with_archives()
+# opens classes.db with the archives attached and a temp view named checkins over all of them.
+
+ARCHIVE_DIR = "archive"
+MAX_ATTACHED = 10 # SQLite's default limit on attached databases per connection
+COLUMNS = 'guild_id, course, member, discord_id, time, "index", session_date'
+BATCH = 2000 # check-ins per transaction while archiving
+
+def term_of(cl):
+    return cl.get("term") or parser.parse(cl["end_date"]).strftime("%Y-%m")
+
+def archive_path(term, directory=ARCHIVE_DIR):
+    return os.path.join(directory, f"classes-{term}.db")
+
+def class_range(cl): #(guild_id or None for any guild, course, first day, last day)
+    return cl.get("guild_id"), cl["channel"], parser.parse(cl["start_date"]).date().isoformat(), parser.parse(cl["end_date"]).date().isoformat()
+
+def ended_terms(classes, today, after_days): #{term: [class_range(cl)]} for classes that are due
+    terms = {}
+    for cl in classes:
+        if parser.parse(cl["end_date"]).date() + timedelta(days=after_days) < today:
+            terms.setdefault(term_of(cl), []).append(class_range(cl))
+    return terms
+
+def _matching(ranges):
+    where = " or ".join(["(main.checkins.guild_id=coalesce(?, main.checkins.guild_id) and main.checkins.course=? "
+                         "and main.checkins.session_date between ? and ?)"] * len(ranges))
+    return where, [value for r in ranges for value in r]
+
+def _unroll(con, rows): # take archived rows out of the rollups, the reverse of what check_in() adds
+    sessions = Counter((guild_id, course, session_date) for _, guild_id, course, session_date, _ in rows)
+    students = Counter((guild_id, course, discord_id) for _, guild_id, course, _, discord_id in rows)
+    con.executemany("update course_sessions set checkins=checkins-? where guild_id=? and course=? and session_date=?", [(n, *k) for k, n in sessions.items()])
+    con.executemany("delete from course_sessions where guild_id=? and course=? and session_date=? and checkins<=0", list(sessions))
+    con.executemany("update student_attendance set sessions=sessions-? where guild_id=? and course=? and discord_id=?", [(n, *k) for k, n in students.items()])
+    con.executemany("delete from student_attendance where guild_id=? and course=? and discord_id=? and sessions<=0", list(students))
+
+def archive_ended(path, classes, after_days=30, directory=ARCHIVE_DIR, today=None, dry_run=False, vacuum=False, batch=BATCH): #returns {term: rows archived}
+    # Runs next to the bot: every transaction covers at most `batch` rows, so a check-in never waits
+    # long behind it. A full VACUUM (vacuum=True) rewrites the whole file and is only for when the
+    # bot is stopped; otherwise freed pages are reused, or returned by incremental_vacuum.
+    today = today or datetime.now().date()
+    con = sqlite3.connect(path)
+    migrate(con)
+    with con: # rows from before v10 must carry their guild before they leave classes.db
+        assign_guilds(con, [class_range(cl) for cl in classes if cl.get("guild_id")])
+    con.isolation_level = None # transactions are explicit; attach, detach and vacuum can't run inside one
+    moved = {}
+    try:
+        for term, ranges in ended_terms(classes, today, after_days).items():
+            where, params = _matching(ranges)
+            if dry_run:
+                n = con.execute(f"select count(*) from main.checkins where {where}", params).fetchone()[0]
+                if n: moved[term] = n
+                continue
+            if not con.execute(f"select 1 from main.checkins where {where} limit 1", params).fetchone():
+                continue
+
+            os.makedirs(directory, exist_ok=True)
+            con.execute("attach database ? as archive", (archive_path(term, directory),))
+            try:
+                con.execute("begin")
+                con.execute('create table if not exists archive.checkins (guild_id INTEGER not null default 0, course TEXT, member TEXT, discord_id TEXT, time TEXT, "index" INTEGER, session_date TEXT)')
+                if "guild_id" not in [row[1] for row in con.execute("pragma archive.table_info(checkins)")]: # an archive from before v10
+                    con.execute("alter table archive.checkins add column guild_id INTEGER not null default 0")
+                con.execute("drop index if exists archive.checkins_course_session")
+                con.execute("create unique index if not exists archive.checkins_guild_session on checkins (guild_id, course, session_date, discord_id)")
+                con.execute("commit")
+
+                last = 0 # walk the table in rowid order, so each batch resumes where the previous one stopped
+                while True:
+                    rows = con.execute(f"select rowid, guild_id, course, session_date, discord_id from main.checkins where rowid > ? and ({where}) "
+                                       f"order by rowid limit {batch}", [last] + params).fetchall()
+                    if not rows: break
+                    last = rows[-1][0]
+                    ids = [row[0] for row in rows]
+                    marks = ",".join("?" * len(ids))
+
+                    # copy and commit first: a commit across attached WAL databases isn't atomic, and
+                    # the copy is idempotent, so a crash before the delete just repeats it next time
+                    con.execute("begin")
+                    con.execute(f"insert or ignore into archive.checkins ({COLUMNS}) select {COLUMNS} from main.checkins where rowid in ({marks})", ids)
+                    con.execute("commit")
+                    missing = con.execute(f"""select count(*) from main.checkins where rowid in ({marks}) and not exists (select 1 from archive.checkins a
+                        where a.guild_id=main.checkins.guild_id and a.course=main.checkins.course and a.session_date=main.checkins.session_date
+                        and a.discord_id=main.checkins.discord_id)""", ids).fetchone()[0]
+                    if missing:
+                        raise RuntimeError(f"{missing} check-ins for {term} did not reach {archive_path(term, directory)}; they were not deleted")
+
+                    con.execute("begin immediate")
+                    con.execute(f"delete from main.checkins where rowid in ({marks})", ids)
+                    _unroll(con, rows)
+                    con.execute("commit")
+                    con.execute("pragma main.incremental_vacuum").fetchall() # runs as the rows are fetched; returns the freed pages when auto_vacuum is incremental, a no-op otherwise
+                    moved[term] = moved.get(term, 0) + len(rows)
+            except Exception:
+                if con.in_transaction: con.execute("rollback")
+                raise
+            finally:
+                con.execute("detach database archive")
+        if vacuum and not dry_run:
+            con.execute("vacuum") # also switches an older file to auto_vacuum=incremental
+            con.execute("pragma wal_checkpoint(truncate)")
+    finally:
+        con.close()
+    return moved
+
+def archived_terms(classes, course, directory=ARCHIVE_DIR): # terms with an archive file that may hold this course's rows
+    return sorted({term_of(cl) for cl in classes if cl["channel"] == course and os.path.exists(archive_path(term_of(cl), directory))})
+
+def connect_with_archives(path, terms=None, directory=ARCHIVE_DIR): #read-only connection where `checkins` also covers archived terms (all by default)
+    files = [archive_path(t, directory) for t in terms] if terms is not None else sorted(glob.glob(os.path.join(directory, "classes-*.db")))
+    if len(files) > MAX_ATTACHED:
+        raise ValueError(f"this needs {len(files)} archived terms, but SQLite can only read {MAX_ATTACHED} at once; export fewer classes at a time")
+    con = sqlite3.connect(f"file:{path}", uri=True, check_same_thread=False) # uri, so the archives can be attached read-only
+    selects = [f"select {COLUMNS} from main.checkins"]
+    for i, f in enumerate(files):
+        con.execute(f"attach database ? as archive{i}", (f"file:{f}?mode=ro",))
+        legacy = "guild_id" not in [row[1] for row in con.execute(f"pragma archive{i}.table_info(checkins)")] # archived before v10
+        selects.append(f"select {COLUMNS.replace('guild_id', '0', 1) if legacy else COLUMNS} from archive{i}.checkins")
+    con.execute("create temp view checkins as " + " union all ".join(selects)) # temp names shadow main's
+    con.execute("pragma query_only=1")
+    return con
+
+def read(path, terms, fn, *args, **kwargs): # fn(con, ...) against the live and archived check-ins together
+    con = connect_with_archives(path, terms)
+    try:
+        return fn(con, *args, **kwargs)
+    finally:
+        con.close()
+
+if __name__ == "__main__": # python archive.py [path] [--dry-run] [--vacuum] archives the classes in config.json that have ended
+    import json
+    import sys
+    args = [a for a in sys.argv[1:] if a not in ("--dry-run", "--vacuum")]
+    config = json.loads(open("config.json").read())
+    after_days = config.get("archive_after_days")
+    moved = archive_ended(args[0] if args else "classes.db", config["classes"], 30 if after_days is None else after_days,
+                          dry_run="--dry-run" in sys.argv, vacuum="--vacuum" in sys.argv)
+    for term, n in moved.items():
+        print(f"{term}: {n} check-ins" + (" would be archived" if "--dry-run" in sys.argv else f" archived to {archive_path(term)}"))
+    print(f"{sum(moved.values())} check-ins" + (" to archive" if "--dry-run" in sys.argv else " archived"))
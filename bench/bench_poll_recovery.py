@@ -0,0 +1,54 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import discord
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from database import Database
+from polls import PollStore
+
+# Times startup recovery of open polls: loading definitions and votes from classes.db and building
+# views with per-poll custom_ids of the same shape as PollView/OpenPollView. Rescanning open-ended
+# polls' answer journals (polls.AnswerJournal) is not included.
+# usage: python bench/bench_poll_recovery.py [polls] [votes per poll]
+
+def build_view(p):
+    view = discord.ui.View(timeout=None)
+    if p["kind"] == "open":
+        view.add_item(discord.ui.Button(label="Answer Poll", custom_id=f"openpoll:{p['poll_id']}:answer"))
+        view.add_item(discord.ui.Button(label="End Poll", custom_id=f"openpoll:{p['poll_id']}:end"))
+    else:
+        for i, option in enumerate(p["options"]):
+            view.add_item(discord.ui.Button(label=option, custom_id=f"poll:{p['poll_id']}:{i}"))
+        view.add_item(discord.ui.Button(label="End Poll", row=4, custom_id=f"poll:{p['poll_id']}:end"))
+    return view
+
+async def main():
+    n_polls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_votes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    db = Database(os.path.join(tempfile.mkdtemp(), "classes.db"))
+    store = PollStore(db)
+    rng = random.Random(1)
+    for p in range(n_polls):
+        kind = "open" if p % 5 == 0 else "choice"
+        options = [] if kind == "open" else [f"Option {i}" for i in range(rng.randrange(2, 8))]
+        store.create(str(p), kind, f"Question {p}?", options, 1, 1)
+        if kind == "open": continue
+        for user in range(n_votes):
+            store.vote(str(p), user, rng.randrange(len(options)))
+    await db.execute("select 1") # waits for the write-behind queue to drain
+
+    t = time.perf_counter()
+    recovered = store.load_open()
+    loaded = time.perf_counter()
+    views = [build_view(p) for p in recovered]
+    built = time.perf_counter()
+    print(f"{len(views)} polls, {n_votes} votes each")
+    print(f"load from SQLite: {(loaded - t) * 1000:.0f}ms, build views: {(built - loaded) * 1000:.0f}ms, total: {(built - t) * 1000:.0f}ms")
+    db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
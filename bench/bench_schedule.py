@@ -0,0 +1,68 @@
+import os
+import sys
+import timeit
+from datetime import datetime
+from dateutil import parser
+import pytz
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from schedule import ScheduleIndex
+
+# Compares the old linear get_period against the compiled ScheduleIndex as the number of classes grows.
+# usage: python bench/bench_schedule.py
+
+TZS = ["America/New_York", "America/Chicago", "America/Denver", "America/Los_Angeles"]
+
+def make_classes(n):
+    classes = []
+    for i in range(n):
+        classes.append({
+            "name": f"CLASS{i}",
+            "channel": f"class{i}",
+            "role": f"CLASS{i}",
+            "password": "",
+            "start_date": "1/1/2020",
+            "end_date": "12/31/2099",
+            "tz": TZS[i % len(TZS)],
+            "periods": [{"day": "monday", "start": "8:00 am", "end": "11:59 pm"},
+                        {"day": "tuesday", "start": "12:00 am", "end": "11:59 pm"},
+                        {"day": "wednesday", "start": "9:35 am", "end": "10:50 am"},
+                        {"day": "thursday", "start": "12:00 am", "end": "11:59 pm"},
+                        {"day": "friday", "start": "1:00 pm", "end": "2:15 pm"}],
+            "exceptions": ["11/24/2022", "11/25/2022", "3/14/2023", "3/16/2023"],
+        })
+    return classes
+
+def linear_get_period(classes, channel): # the pre-index implementation, kept here as the baseline
+    for cl in classes:
+        if cl["channel"] != channel: continue
+        lt = datetime.now().astimezone(tz=pytz.timezone(cl["tz"]))
+        dayname = lt.strftime("%A").lower()
+        current_day = lt.date()
+        start_day = parser.parse(cl["start_date"]).date()
+        end_day = parser.parse(cl["end_date"]).date()
+        exceptions = [parser.parse(d).date() for d in cl["exceptions"]]
+        if (current_day < start_day) or (current_day > end_day) or (current_day in exceptions): continue
+        for period in cl["periods"]:
+            start_time = datetime.strptime(period["start"], "%I:%M %p").time()
+            end_time = datetime.strptime(period['end'], "%I:%M %p").time()
+            if (period["day"] == dayname) and (lt.time() >= start_time) and (lt.time() < end_time):
+                return period
+    return None
+
+def per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def main():
+    print(f"{'classes':>8} {'linear us':>12} {'indexed us':>12} {'speedup':>9}")
+    for n in (10, 50, 200, 400, 800):
+        classes = make_classes(n)
+        index = ScheduleIndex(classes)
+        target = f"class{n - 1}" # worst case for the linear scan
+        assert index.get_period(target) is linear_get_period(classes, target)
+        linear = per_call_us(lambda: linear_get_period(classes, target), 20)
+        indexed = per_call_us(lambda: index.get_period(target), 2000)
+        print(f"{n:>8} {linear:>12.1f} {indexed:>12.2f} {linear / indexed:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
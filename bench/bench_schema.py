@@ -0,0 +1,83 @@
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from database import migrate
+
+# Builds a legacy (to_sql-created, unindexed) checkins table, times the bot's queries, migrates it
+# in place and times the same queries against session_date and the new indexes.
+# usage: python bench/bench_schema.py [rows]
+
+COURSES = 40
+STUDENTS = 120
+
+def build_legacy(path, rows):
+    con = sqlite3.connect(path)
+    con.execute('create table checkins (course TEXT, member TEXT, discord_id TEXT, time TEXT, "index" INTEGER)')
+    rng = random.Random(1)
+    start = date(2015, 1, 5)
+    def gen(): # every row is a distinct (course, session, student), so nothing is lost to the dedupe step
+        n = 0
+        session = start
+        while True:
+            for course in range(COURSES):
+                for student in rng.sample(range(STUDENTS), rng.randrange(STUDENTS // 2, STUDENTS)):
+                    yield (f"course{course}", f"Student {student}", f"student{course}_{student}",
+                           f"{session} {rng.randrange(8, 18):02d}:{rng.randrange(60):02d}:00", 0)
+                    n += 1
+                    if n == rows: return
+            session += timedelta(days=2)
+    con.executemany("insert into checkins values (?,?,?,?,?)", gen())
+    con.commit()
+    return con
+
+def queries(date_expr, guild=""): # guild: the guild_id filter the bot adds since v10 (legacy rows migrate to guild 0)
+    return {
+        "attendance (admin)": (f"select distinct member from checkins where {guild}course=? and {date_expr}=?", ("course7", "{last}")),
+        "attendance (dates)": (f"select distinct {date_expr} as date from checkins where {guild}course=? and discord_id=? order by date", ("course7", "student7_3")),
+        "attendance (counts)": (f"select discord_id, count(distinct {date_expr}) as cnt from checkins where {guild}course=? group by discord_id", ("course7",)),
+        "attendance (sessions)": (f"select count(distinct {date_expr}) as cnt from checkins where {guild}course=?", ("course7",)),
+        "export_attendance": (f"select discord_id, member, {date_expr} as date from checkins where {guild}course=?", ("course7",)),
+        "coldcall": (f"select distinct member from checkins where {guild}course=? and {date_expr}=?", ("course7", "{last}")),
+    }
+
+def time_queries(con, date_expr, last, guild=""):
+    results = {}
+    for name, (sql, params) in queries(date_expr, guild).items():
+        params = tuple(last if p == "{last}" else p for p in params)
+        best = float("inf")
+        for _ in range(3):
+            t = time.perf_counter()
+            con.execute(sql, params).fetchall()
+            best = min(best, time.perf_counter() - t)
+        results[name] = best * 1000
+    return results
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    path = os.path.join(tempfile.mkdtemp(), "classes.db")
+    print(f"building {rows} legacy rows in {path}")
+    con = build_legacy(path, rows)
+    last = con.execute("select max(date(time)) from checkins").fetchone()[0]
+
+    before = time_queries(con, "date(time)", last)
+    t = time.perf_counter()
+    migrate(con)
+    print(f"migration: {time.perf_counter() - t:.1f}s, {con.execute('select count(*) from checkins').fetchone()[0]} rows after dedupe")
+    t = time.perf_counter()
+    migrate(con) # second run must be a no-op
+    print(f"re-running migration: {(time.perf_counter() - t) * 1000:.2f}ms")
+    after = time_queries(con, "session_date", last, "guild_id=0 and ")
+
+    print(f"{'query':<24} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in before:
+        print(f"{name:<24} {before[name]:>10.2f} {after[name]:>10.2f} {before[name] / after[name]:>7.0f}x")
+    con.close()
+
+if __name__ == "__main__":
+    main()
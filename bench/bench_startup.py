@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Times a cold start (importing main.py in a fresh interpreter) and on_ready, with Discord's command
+# sync endpoints replaced by fakes that take --latency ms each. on_ready runs twice per process, as
+# on the first connect and on a reconnect. Every run after the first reuses the same classes.db,
+# like a restart. It also lists which heavy libraries were loaded by the import.
+# usage: python bench/bench_startup.py [runs] [guilds] [--latency 300]
+
+HEAVY = ["pandas", "numpy", "matplotlib", "google.generativeai"]
+
+def child(n_guilds, latency): # runs inside the working directory prepared by main()
+    sys.path.insert(0, ROOT)
+    t = time.perf_counter()
+    import main
+    imported = time.perf_counter() - t
+    loaded = [m for m in HEAVY if m in sys.modules]
+
+    calls = []
+    async def fake_upsert(application_id, payload):
+        calls.append("global")
+        await asyncio.sleep(latency)
+    async def fake_sync(guild=None):
+        calls.append(guild.id)
+        await asyncio.sleep(latency)
+    main.bot.http.bulk_upsert_global_commands = fake_upsert
+    main.bot.tree.sync = fake_sync
+    main.bot.schedule_started = True # the scheduler and lag monitor need a running bot loop
+    for i in range(n_guilds):
+        main.bot._connection._guilds[i + 1] = SimpleNamespace(id=i + 1, members=[], roles=[], channels=[])
+
+    async def ready():
+        times = []
+        for _ in range(2): # connect, then a reconnect
+            before = len(calls)
+            t = time.perf_counter()
+            await main.on_ready()
+            times.append((time.perf_counter() - t, len(calls) - before))
+        await main.db.write(lambda con: None) # let anything on_ready queued be committed before exiting
+        return times
+    times = asyncio.run(ready())
+    main.db.close()
+    main.offload.shutdown()
+    print(json.dumps({"import": imported, "loaded": loaded, "ready": times}))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("runs", type=int, nargs="?", default=5)
+    ap.add_argument("guilds", type=int, nargs="?", default=3)
+    ap.add_argument("--latency", type=float, default=300, help="ms per fake command sync call")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    runs, n_guilds, latency = args.runs, args.guilds, args.latency
+    if args.child:
+        child(n_guilds, latency / 1000)
+        return
+
+    directory = tempfile.mkdtemp(prefix="classy-startup-")
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump({"key": "", "gemini_api_key": "unused", "classes": []}, f)
+    results = []
+    for run in range(runs):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "1", str(n_guilds), "--latency", str(latency), "--child"],
+                             cwd=directory, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{runs} runs, {n_guilds} guilds, {latency:g}ms per sync call")
+    print(f"import main.py: median {statistics.median(r['import'] for r in results) * 1000:.0f}ms, "
+          f"heavy modules loaded: {', '.join(results[0]['loaded']) or 'none'}")
+    for i, label in enumerate(("first connect", "reconnect")):
+        first = results[0]["ready"][i]
+        restarts = [r["ready"][i] for r in results[1:]]
+        line = f"on_ready {label}: fresh database {first[0] * 1000:.0f}ms ({first[1]} sync calls)"
+        if restarts:
+            line += f", after a restart median {statistics.median(r[0] for r in restarts) * 1000:.0f}ms ({restarts[0][1]} sync calls)"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from summarize import Summarizer
+
+# Runs the summary pipeline against a local fake model with a fixed per-call latency, to show
+# map-reduce concurrency, the prompt cache and the timeout fallback without a Gemini key.
+# usage: python bench/bench_summarize.py [responses]
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    def __init__(self, latency=0.5, hang_on=None):
+        self.latency = latency
+        self.hang_on = hang_on # prompts containing this string never return in time
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(60 if self.hang_on and self.hang_on in prompt else self.latency)
+        return FakeResponse(f"summary of {len(prompt)} characters")
+
+async def timed(label, summarizer, model, question, responses):
+    calls = model.calls
+    t = time.perf_counter()
+    text = await summarizer.summarize(question, responses)
+    print(f"{label:<28} {time.perf_counter() - t:6.2f}s {model.calls - calls:3d} model calls  -> {text[:60]!r}")
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    rng = random.Random(1)
+    words = "the lecture example was clear confusing helpful slow fast recursion pointers memory".split()
+    responses = [" ".join(rng.choice(words) for _ in range(rng.randrange(20, 120))) for _ in range(n)]
+
+    model = FakeModel()
+    summarizer = Summarizer(model, chunk_tokens=2000, concurrency=4)
+    print(f"{n} responses, {len(list(summarizer.chunks(responses)))} chunks, 0.5s per model call")
+    await timed("first summary", summarizer, model, "What was unclear?", responses)
+    await timed("same poll again (cached)", summarizer, model, "What was unclear?", responses)
+
+    serial = Summarizer(model, chunk_tokens=2000, concurrency=1)
+    await timed("concurrency=1", serial, model, "What was still unclear?", responses)
+
+    hanging = FakeModel(latency=0.1, hang_on="part 2 of")
+    await timed("one chunk hangs (timeout=1)", Summarizer(hanging, chunk_tokens=2000, timeout=1), hanging, "Q?", responses)
+    slow = FakeModel(latency=3)
+    await timed("deadline exceeded", Summarizer(slow, timeout=10, deadline=1), slow, "Q?", responses[:5])
+    os._exit(0) # the hung fake calls are still sleeping in worker threads
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,421 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from database import migrate, rebuild_rollups
+
+# Offline load test: imports main.py against a throwaway config.json and classes.db, and drives the
+# real command and button callbacks with local stand-ins for Interaction, Member, Message and
+# channels. Each scenario is a scripted burst (e.g. 400 check-ins spread over 30 seconds); for each
+# one it reports handler latency, event loop lag, and time spent in the database, the offload pools
+# and chart rendering. Fake Discord HTTP calls take --latency ms.
+# usage: python bench/loadtest.py [--scale 0.1] [--save baseline.json] [--compare baseline.json]
+
+GUILD_ID = 1000
+LATENCY = 0.0 # seconds per fake HTTP call, set from --latency
+ids = itertools.count(10**15)
+
+class FakeRole:
+    def __init__(self, name):
+        self.id, self.name = next(ids), name
+        self.mention = f"<@&{self.id}>"
+
+class FakeMember:
+    def __init__(self, guild, name, nick=None, roles=()):
+        self.id, self.name, self.nick = next(ids), name, nick
+        self.guild = guild
+        self.roles = list(roles)
+        self.mention = f"<@{self.id}>"
+        self.display_avatar = SimpleNamespace(url="https://cdn.discordapp.com/embed/avatars/0.png")
+        self.dms = 0
+
+    @property
+    def display_name(self):
+        return self.nick or self.name
+
+    async def send(self, content=None, file=None, **kwargs):
+        await asyncio.sleep(LATENCY)
+        if file: file.close()
+        self.dms += 1
+
+    async def add_roles(self, *roles):
+        await asyncio.sleep(LATENCY)
+        self.roles.extend(roles)
+
+    async def edit(self, nick=None, **kwargs):
+        await asyncio.sleep(LATENCY)
+        self.nick = nick
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None, view=None):
+        self.id = next(ids)
+        self.channel = channel
+        self.content = content
+        self.embeds = [embed] if embed else []
+        self.view = view
+        self.edits = 0
+
+    async def edit(self, content=None, embed=None, view=None, **kwargs):
+        await asyncio.sleep(LATENCY)
+        self.edits += 1
+
+    async def delete(self):
+        await asyncio.sleep(LATENCY)
+
+class FakeChannel:
+    def __init__(self, guild, name):
+        self.id, self.name, self.guild = next(ids), name, guild
+        self.sent = 0
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await asyncio.sleep(LATENCY)
+        self.sent += 1
+        return FakeMessage(self, content, embed, view)
+
+class FakeGuild:
+    def __init__(self, channels, roles):
+        self.id = GUILD_ID
+        self.name = "loadtest"
+        self.channels = [FakeChannel(self, name) for name in channels]
+        self.roles = [FakeRole(name) for name in roles]
+        self.members = []
+
+    def get_member(self, member_id):
+        return next((m for m in self.members if m.id == member_id), None)
+
+    def get_channel(self, channel_id):
+        return next((c for c in self.channels if c.id == channel_id), None)
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.message = None # the public message sent as the response, if any
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, embed=None, view=None, ephemeral=False, **kwargs):
+        await asyncio.sleep(LATENCY)
+        self.done = True
+        if not ephemeral:
+            self.message = FakeMessage(self.interaction.channel, content, embed, view)
+
+    async def defer(self, **kwargs):
+        await asyncio.sleep(LATENCY)
+        self.done = True
+
+    async def edit_message(self, attachments=(), **kwargs):
+        await asyncio.sleep(LATENCY)
+        for file in attachments: file.close()
+        self.done = True
+
+    async def send_modal(self, modal):
+        await asyncio.sleep(LATENCY)
+        self.done = True
+
+class FakeFollowup:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, content=None, wait=False, **kwargs):
+        await asyncio.sleep(LATENCY)
+        if wait: return FakeMessage(self.channel, content)
+
+class FakeAttachment:
+    def __init__(self, data):
+        self.data = data
+
+    async def read(self):
+        await asyncio.sleep(LATENCY)
+        return self.data
+
+class FakeInteraction:
+    def __init__(self, user, channel, message=None):
+        self.id = next(ids)
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id
+        self.message = message
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(channel)
+
+    async def original_response(self):
+        await asyncio.sleep(LATENCY)
+        return self.response.message
+
+def make_classes(n):
+    today = datetime.now()
+    always = [{"day": day, "start": "12:00 am", "end": "11:59 pm"}
+              for day in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")]
+    classes = [{"name": f"Class {i}", "channel": f"class{i}", "role": f"CLASS{i}", "password": "",
+                "start_date": (today - timedelta(days=120)).strftime("%m/%d/%Y"),
+                "end_date": (today + timedelta(days=30)).strftime("%m/%d/%Y"),
+                "tz": "America/New_York", "periods": always, "exceptions": [], "guild_id": GUILD_ID}
+               for i in range(n)]
+    return classes
+
+def seed_history(path, course, students, sessions): # past check-ins, so /attendance and exports have data to read
+    con = sqlite3.connect(path)
+    migrate(con)
+    today = datetime.now().date()
+    rng = random.Random(2)
+    rows = []
+    for s in range(1, sessions + 1):
+        day = (today - timedelta(days=2 * s)).isoformat()
+        for student in students:
+            if rng.random() < 0.8:
+                rows.append((GUILD_ID, course, student.nick, student.name, f"{day} 10:00:00", day))
+    con.execute("begin")
+    con.executemany('insert into checkins (guild_id, course, member, discord_id, time, "index", session_date) values (?,?,?,?,?,0,?)', rows)
+    rebuild_rollups(con)
+    con.execute("commit")
+    con.close()
+    return len(rows)
+
+class Recorder: # per-scenario timing samples in milliseconds
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name, ms):
+        self.samples.setdefault(name, []).append(ms)
+
+    def wrap(self, name, fn):
+        if asyncio.iscoroutinefunction(fn):
+            async def timed(*args, **kwargs):
+                t = time.perf_counter()
+                try: return await fn(*args, **kwargs)
+                finally: self.add(name, (time.perf_counter() - t) * 1000)
+        else:
+            def timed(*args, **kwargs):
+                t = time.perf_counter()
+                try: return fn(*args, **kwargs)
+                finally: self.add(name, (time.perf_counter() - t) * 1000)
+        return timed
+
+def percentile(values, p): # nearest rank
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+def stats(values):
+    if not values:
+        return {"n": 0}
+    return {"n": len(values), "p50": percentile(values, 50), "p99": percentile(values, 99), "max": max(values)}
+
+async def sample_lag(samples, interval=0.01): # how late the loop wakes a sleeper, like offload.LoopLagMonitor
+    while True:
+        t = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - t - interval) * 1000)
+
+async def burst(recorder, n, seconds, handler, seed=1): # n calls of handler(i) at random times over `seconds`
+    rng = random.Random(seed)
+    arrivals = sorted(rng.uniform(0, seconds) for _ in range(n))
+    start = time.perf_counter()
+    errors = []
+    async def one(i):
+        await asyncio.sleep(max(0, start + arrivals[i] - time.perf_counter()))
+        t = time.perf_counter()
+        try:
+            await handler(i)
+        except Exception as e:
+            errors.append(e)
+        recorder.add("handler", (time.perf_counter() - t) * 1000)
+    await asyncio.gather(*(one(i) for i in range(n))) # like discord.py, every interaction gets its own task
+    if errors:
+        print(f"  {len(errors)} handler errors, first: {errors[0]!r}")
+    return len(errors)
+
+async def run(args):
+    global LATENCY
+    LATENCY = args.latency / 1000
+    directory = tempfile.mkdtemp(prefix="classy-loadtest-")
+    classes = make_classes(args.classes)
+    guild = FakeGuild([cl["channel"] for cl in classes], ["Admin"] + [cl["role"] for cl in classes])
+    for cl, channel in zip(classes, guild.channels):
+        cl["channel_id"] = channel.id
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump({"key": "", "classes": classes}, f)
+    admin = FakeMember(guild, "prof", "Professor", [guild.roles[0]])
+    students = [FakeMember(guild, f"student{i}", f"Student {i}") for i in range(args.students)]
+    guild.members = [admin] + students
+    seeded = seed_history(os.path.join(directory, "classes.db"), guild.channels[0].name, students, args.history)
+
+    os.chdir(directory) # main.py reads config.json and opens classes.db in the working directory
+    t = time.perf_counter()
+    import main as classy # no threads may exist before this: it forks the offload process pool
+    import helpqueue
+    print(f"imported main.py in {(time.perf_counter() - t) * 1000:.0f}ms ({seeded} seeded check-ins in {args.history} sessions)")
+    classy.bot._connection._guilds[guild.id] = guild # what the gateway would fill in on connect
+    classy.guild_cache.index(guild)
+    if classy.charts.available:
+        classy.offload.warm(classy.charts.preload) # as on_ready does
+
+    recorder = Recorder()
+    classy.db.read = recorder.wrap("db_read", classy.db.read)
+    classy.db.write = recorder.wrap("db_write", classy.db.write)
+    classy.offload.run_io = recorder.wrap("offload_io", classy.offload.run_io)
+    classy.offload.run_cpu = recorder.wrap("chart_render", classy.offload.run_cpu)
+    classy.poll_charts.get = recorder.wrap("chart_cache", classy.poll_charts.get)
+    classy.report_charts.get = recorder.wrap("report_cache", classy.report_charts.get)
+    helpqueue.HelpQueue.render = recorder.wrap("queue_render", helpqueue.HelpQueue.render)
+    classy.member_updates.apply = recorder.wrap("member_update", classy.member_updates.apply)
+
+    channel = guild.channels[0]
+    def student(i):
+        return students[i % len(students)]
+
+    queue_group = classy.bot.tree.get_command("queue")
+    def queue_cmd(name, *args):
+        return lambda interaction: queue_group.get_command(name).callback(queue_group, interaction, *args)
+
+    poll = {}
+    async def create_poll(i):
+        interaction = FakeInteraction(admin, channel)
+        await classy.poll.callback(interaction, "Which topic next?", "Joins,Indexes,Transactions,Views")
+        poll["message"] = interaction.response.message
+        poll["buttons"] = [c for c in poll["message"].view.children if not c.custom_id.endswith(":end")]
+
+    async def vote(i):
+        await poll["buttons"][i % len(poll["buttons"])].callback(FakeInteraction(student(i), channel, poll["message"]))
+
+    async def end_poll(i):
+        await poll["message"].view.end_poll_callback(FakeInteraction(admin, channel, poll["message"]))
+
+    # every student plus a few who never joined the server, then the same file again, which resumes from its journal
+    roster = "username,name\n" + "".join(f"{s.name},{s.nick} Lastname\n" for s in students) + "".join(f"missing{i},Nobody\n" for i in range(10))
+    async def import_roster(i):
+        for _ in range(2):
+            await classy.import_roster.callback(FakeInteraction(admin, channel), FakeAttachment(roster.encode()))
+
+    # (name, calls, seconds to spread them over before --scale, handler(i))
+    scenarios = [
+        ("checkin", args.checkins, 30, lambda i: classy.checkin.callback(FakeInteraction(student(i), channel))),
+        ("checkin_repeat", 100, 5, lambda i: classy.checkin.callback(FakeInteraction(student(i), channel))),
+        ("attendance", 200, 10, lambda i: classy.attendance.callback(FakeInteraction(student(i), channel))),
+        ("attendance_admin", 10, 5, lambda i: classy.attendance.callback(FakeInteraction(admin, channel))),
+        ("attendance_report", 20, 5, lambda i: classy.attendance_report.callback(FakeInteraction(admin, channel))),
+        ("export_attendance", 5, 5, lambda i: classy.export_attendance.callback(FakeInteraction(admin, channel))),
+        ("poll_create", 1, 0, create_poll),
+        ("poll_vote", args.votes, 10, vote),
+        ("poll_end", 1, 0, end_poll),
+        ("queue_join", 150, 10, lambda i: queue_cmd("join")(FakeInteraction(student(i), channel))),
+        ("queue_list", 20, 5, lambda i: queue_cmd("list", 1 + i % 4)(FakeInteraction(student(i), channel))),
+        ("queue_next", 50, 10, lambda i: queue_cmd("next")(FakeInteraction(admin, channel))),
+        ("queue_leave", 50, 5, lambda i: queue_cmd("leave")(FakeInteraction(student(100 + i), channel))),
+        ("schedule_open", args.classes, 0, None),
+        ("import_roster", 1, 0, import_roster),
+        ("stats", 10, 1, lambda i: classy.stats.callback(FakeInteraction(admin, channel))),
+    ]
+
+    results = {}
+    for name, n, seconds, handler in scenarios:
+        recorder.samples = {}
+        lag = []
+        lag_task = asyncio.create_task(sample_lag(lag))
+        edits_before = (classy.edits.requested, classy.edits.sent)
+        t = time.perf_counter()
+        errors = 0
+
+        if name == "schedule_open": # every class's period is already running, so all of them open at startup
+            sent_before = sum(c.sent for c in guild.channels)
+            start = time.perf_counter()
+            task = asyncio.create_task(classy.check_schedule())
+            while sum(c.sent for c in guild.channels) - sent_before < n and time.perf_counter() - start < 30:
+                await asyncio.sleep(0.001)
+            recorder.add("handler", (time.perf_counter() - start) * 1000)
+            task.cancel()
+        else:
+            errors = await burst(recorder, n, seconds * args.scale, handler)
+
+        handler_done = time.perf_counter()
+        await classy.db.execute("select 1") # wait for write-behind rows (votes, queue changes) to commit
+        recorder.add("db_drain", (time.perf_counter() - handler_done) * 1000)
+        while classy.edits.tasks: # let coalesced message edits finish so they don't spill into the next scenario
+            await asyncio.sleep(0.01)
+        lag_task.cancel()
+
+        elapsed = time.perf_counter() - t
+        timings = {k: stats(v) for k, v in recorder.samples.items() if k != "handler"}
+        results[name] = {"calls": n, "seconds": elapsed, "errors": errors, "handler": stats(recorder.samples.get("handler", [])),
+                         "loop_lag": stats(lag), "timings": timings,
+                         "edits": {"requested": classy.edits.requested - edits_before[0], "sent": classy.edits.sent - edits_before[1]}}
+        report(name, results[name])
+
+    classy.db.close()
+    classy.offload.shutdown()
+    return {"scale": args.scale, "latency_ms": args.latency, "python": sys.version.split()[0], "scenarios": results}
+
+def fmt(s):
+    return f"p50 {s['p50']:.2f}ms p99 {s['p99']:.2f}ms max {s['max']:.2f}ms" if s["n"] else "-"
+
+def report(name, r):
+    print(f"{name}: {r['calls']} calls in {r['seconds']:.1f}s, handler {fmt(r['handler'])}, loop lag {fmt(r['loop_lag'])}"
+          + (f", {r['errors']} errors" if r["errors"] else ""))
+    for k, s in sorted(r["timings"].items()):
+        print(f"  {k}: {s['n']} x {fmt(s)}")
+    if r["edits"]["requested"]:
+        print(f"  message edits: {r['edits']['requested']} requested, {r['edits']['sent']} sent")
+
+def compare(baseline, current, tolerance): #prints per-scenario changes; returns the number of regressions
+    if baseline.get("scale") != current["scale"] or baseline.get("latency_ms") != current["latency_ms"]:
+        print("warning: baseline was recorded with a different --scale or --latency")
+    regressions = 0
+    print("\nvs baseline:")
+    for name, r in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base or not base["handler"]["n"]:
+            continue
+        line = []
+        for key in ("p50", "p99"):
+            old, new = base["handler"][key], r["handler"][key]
+            change = (new - old) / old * 100 if old else 0
+            slower = new > old * (1 + tolerance) and new - old > 1 # ignore sub-millisecond noise
+            regressions += slower
+            line.append(f"{key} {old:.2f} -> {new:.2f}ms ({change:+.0f}%){' REGRESSION' if slower else ''}")
+        print(f"  {name}: " + ", ".join(line))
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply burst durations (0.1 = ten times the arrival rate)")
+    ap.add_argument("--latency", type=float, default=0.0, help="ms per fake Discord HTTP call")
+    ap.add_argument("--students", type=int, default=400)
+    ap.add_argument("--checkins", type=int, default=400)
+    ap.add_argument("--votes", type=int, default=250)
+    ap.add_argument("--classes", type=int, default=20)
+    ap.add_argument("--history", type=int, default=30, help="past sessions of check-ins to seed")
+    ap.add_argument("--save", metavar="FILE", help="write the results as a baseline")
+    ap.add_argument("--compare", metavar="FILE", help="compare against a saved baseline; exits 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline (default 25%%)")
+    args = ap.parse_args()
+    for option in ("save", "compare"): # resolve before run() changes the working directory
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+
+    current = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"baseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import asyncio
+import importlib.util
+import io
+from collections import OrderedDict
+
+available = importlib.util.find_spec("matplotlib") is not None
+if not available:
+    print("matplotlib library not found. Charts will be disabled.")
+
+# Charts are drawn with the object-oriented Figure/Agg API (no pyplot global state), so renders can
+# run side by side in Offload's process pool. Results are cached as PNG bytes by the caller's key.
+# matplotlib is only imported where charts are rendered, so it stays out of the bot's startup.
+
+def preload(): # import matplotlib ahead of the first render, e.g. in each chart worker process
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+def render_poll_chart(question, options, counts): #returns PNG bytes
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(6, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.bar(options, counts)
+    ax.set_title(question)
+    ax.set_ylabel("Votes")
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+def render_attendance_chart(course, dates, counts, trend, distribution): #returns PNG bytes
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.ticker import MaxNLocator
+    fig = Figure(figsize=(10, 4))
+    FigureCanvasAgg(fig)
+    sessions, students = fig.subplots(1, 2, gridspec_kw={"width_ratios": [3, 2]})
+    x = range(len(dates))
+    sessions.bar(x, counts, label="Check-ins")
+    if len(trend):
+        sessions.plot(range(len(dates) - len(trend), len(dates)), trend, color="tab:orange", label="Rolling average")
+    step = max(1, len(dates) // 12) # keep the date labels readable
+    sessions.set_xticks(list(x)[::step], dates[::step], rotation=45, ha="right")
+    sessions.set_title(f"{course}: check-ins per session")
+    sessions.legend()
+    students.bar(range(len(distribution)), distribution)
+    students.set_title("Sessions attended per student")
+    students.set_xlabel("Sessions attended")
+    students.set_ylabel("Students")
+    students.yaxis.set_major_locator(MaxNLocator(integer=True))
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+class ChartCache: # LRU of rendered charts; concurrent requests for the same key share one render
+    def __init__(self, size=64):
+        self.size = size
+        self.entries = OrderedDict() # key -> task resolving to PNG bytes
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, render): #render is a coroutine function producing the PNG bytes
+        task = self.entries.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(render())
+            self.entries[key] = task
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        try:
+            return await asyncio.shield(task) # one waiter giving up must not cancel the shared render
+        except Exception:
+            if self.entries.get(key) is task:
+                del self.entries[key]
+            raise
@@ -0,0 +1,149 @@
+from datetime import datetime
+from database import migrate, rebuild_rollups
+
+# Who has checked in to which session. The sets are the fast path for duplicate checks; the
+# unique (guild, course, session date, discord_id) index in classes.db is what actually guarantees it.
+# A course is a channel name within one guild, so the same name in two guilds doesn't mix.
+# Each new check-in also bumps the course_sessions/student_attendance rollups in the same
+# transaction, and CourseRollup mirrors them in memory for /attendance.
+
+class CourseRollup:
+    def __init__(self):
+        self.sessions = 0 # distinct session dates with at least one check-in
+        self.students = {} # discord_id -> sessions attended
+        self.histogram = {} # sessions attended -> number of students, bounded by the number of sessions
+        self.total = 0
+
+    def add(self, discord_id, count=1):
+        old = self.students.get(discord_id, 0)
+        if old:
+            self.histogram[old] -= 1
+            if not self.histogram[old]: del self.histogram[old]
+        self.students[discord_id] = old + count
+        self.histogram[old + count] = self.histogram.get(old + count, 0) + 1
+        self.total += count
+
+    def count(self, discord_id):
+        return self.students.get(discord_id, 0)
+
+    def average(self):
+        return self.total / len(self.students) if self.students else 0.0
+
+    def rank(self, count): # 1 + number of students who attended more sessions
+        return sum(n for c, n in self.histogram.items() if c > count) + 1
+
+class CheckinStore:
+    def __init__(self, db):
+        self.db = db
+        self.sessions = {} # (guild_id, course, session_date) -> set of discord_id
+        self.rollups = {} # (guild_id, course) -> CourseRollup
+        self.today = None
+
+    def load(self, session_date=None): #rebuild today's sets and the rollups from the database, e.g. after a restart
+        session_date = session_date or datetime.now().strftime("%Y-%m-%d")
+        self._apply(session_date, self.db.read_sync(self._read, session_date))
+
+    async def reload(self, session_date=None): # load() with the queries on a worker thread, for use from the event loop
+        session_date = session_date or datetime.now().strftime("%Y-%m-%d")
+        self._apply(session_date, await self.db.read(self._read, session_date))
+
+    def _read(self, con, session_date):
+        return (con.execute("select guild_id, course, discord_id from checkins where session_date=?", (session_date,)).fetchall(),
+                con.execute("select guild_id, course, count(*) from course_sessions group by guild_id, course").fetchall(),
+                con.execute("select guild_id, course, discord_id, sessions from student_attendance").fetchall())
+
+    def _apply(self, session_date, rows):
+        checked_in, sessions, students = rows
+        self.sessions = {}
+        self.today = session_date
+        for guild_id, course, discord_id in checked_in:
+            self.sessions.setdefault((guild_id, course, session_date), set()).add(discord_id)
+        self.rollups = {}
+        for guild_id, course, n in sessions:
+            self.rollup(guild_id, course).sessions = n
+        for guild_id, course, discord_id, n in students:
+            self.rollup(guild_id, course).add(discord_id, n)
+
+    def rollup(self, guild_id, course):
+        if (guild_id, course) not in self.rollups:
+            self.rollups[(guild_id, course)] = CourseRollup()
+        return self.rollups[(guild_id, course)]
+
+    def checked_in(self, guild_id, course, session_date):
+        return self.sessions.get((guild_id, course, session_date), set())
+
+    async def check_in(self, guild_id, course, member, discord_id, when=None): #True if this is a new check-in, False if already checked in
+        when = when or datetime.now()
+        session_date = when.strftime("%Y-%m-%d")
+        if session_date != self.today: # a new day: yesterday's sets are no longer needed
+            self.sessions = {k: v for k, v in self.sessions.items() if k[2] >= session_date}
+            self.today = session_date
+
+        # claim the slot before awaiting so a second concurrent interaction sees it immediately
+        seen = self.sessions.setdefault((guild_id, course, session_date), set())
+        if discord_id in seen:
+            return False
+        seen.add(discord_id)
+
+        def insert(con):
+            if con.execute('insert or ignore into checkins (guild_id, course, member, discord_id, time, "index", session_date) values (?,?,?,?,?,0,?)',
+                           (guild_id, course, member, discord_id, when.strftime("%Y-%m-%d %H:%M:%S"), session_date)).rowcount != 1:
+                return False, False
+            new_session = con.execute("update course_sessions set checkins=checkins+1 where guild_id=? and course=? and session_date=?",
+                                      (guild_id, course, session_date)).rowcount == 0
+            if new_session:
+                con.execute("insert into course_sessions (guild_id, course, session_date, checkins) values (?,?,?,1)", (guild_id, course, session_date))
+            con.execute("insert into student_attendance (guild_id, course, discord_id, sessions) values (?,?,?,1) "
+                        "on conflict (guild_id, course, discord_id) do update set sessions=sessions+1", (guild_id, course, discord_id))
+            return True, new_session
+        try:
+            inserted, new_session = await self.db.write(insert)
+        except Exception:
+            seen.discard(discord_id)
+            raise
+        if inserted:
+            rollup = self.rollup(guild_id, course)
+            rollup.sessions += new_session
+            rollup.add(discord_id)
+        return inserted
+
+def verify_rollups(con, fix=False): #compare the rollup tables against the raw rows; returns a list of mismatches
+    mismatches = con.execute("""
+        select 'sessions', r.guild_id || '/' || r.course, r.n, coalesce(t.n, 0) from
+            (select guild_id, course, count(*) as n from course_sessions group by guild_id, course) r
+            left join (select guild_id, course, count(distinct session_date) as n from checkins group by guild_id, course) t using (guild_id, course)
+        where r.n != coalesce(t.n, 0)
+        union all
+        select 'sessions', t.guild_id || '/' || t.course, 0, t.n from
+            (select guild_id, course, count(distinct session_date) as n from checkins group by guild_id, course) t
+        where not exists (select 1 from course_sessions r where r.guild_id=t.guild_id and r.course=t.course)
+        union all
+        select 'session', r.guild_id || '/' || r.course || '/' || r.session_date, r.checkins, coalesce(t.n, 0) from course_sessions r
+            left join (select guild_id, course, session_date, count(*) as n from checkins group by guild_id, course, session_date) t using (guild_id, course, session_date)
+        where r.checkins != coalesce(t.n, 0)
+        union all
+        select 'student', r.guild_id || '/' || r.course || '/' || r.discord_id, r.sessions, coalesce(t.n, 0) from student_attendance r
+            left join (select guild_id, course, discord_id, count(*) as n from checkins group by guild_id, course, discord_id) t using (guild_id, course, discord_id)
+        where r.sessions != coalesce(t.n, 0)
+        union all
+        select 'student', t.guild_id || '/' || t.course || '/' || t.discord_id, 0, t.n from
+            (select guild_id, course, discord_id, count(*) as n from checkins group by guild_id, course, discord_id) t
+            left join student_attendance r using (guild_id, course, discord_id)
+        where r.sessions is null
+    """).fetchall()
+    if mismatches and fix:
+        with con:
+            rebuild_rollups(con)
+    return mismatches
+
+if __name__ == "__main__": # python checkins.py [path] [--fix] checks (and optionally rebuilds) the rollups
+    import sqlite3
+    import sys
+    args = [a for a in sys.argv[1:] if a != "--fix"]
+    con = sqlite3.connect(args[0] if args else "classes.db")
+    migrate(con)
+    mismatches = verify_rollups(con, fix="--fix" in sys.argv)
+    for kind, key, rollup, actual in mismatches:
+        print(f"{kind} {key}: rollup {rollup}, actual {actual}")
+    print(f"{len(mismatches)} mismatches" + (" (rebuilt)" if mismatches and "--fix" in sys.argv else ""))
+    con.close()
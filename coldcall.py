@@ -0,0 +1,120 @@
+import random
+from datetime import datetime
+from dateutil import parser
+
+# Cold-call rosters for the sessions running today, filled from check-ins. Students are bucketed by
+# how many times they've been called this term (the class's start_date..end_date, since a channel
+# name is often reused for the next term's class); a bucket is chosen by total weight (each extra call
+# halves a student's weight relative to the least-called) and then a student uniformly within it,
+# so a pick costs O(number of distinct call counts) rather than O(students).
+
+class SessionRoster:
+    def __init__(self, counts):
+        self.counts = counts # discord_id -> times called this term, shared by the course's rosters
+        self.names = {} # discord_id -> display name at check-in
+        self.buckets = {} # times called -> list of discord_ids
+        self.slots = {} # discord_id -> index in its bucket
+
+    def __len__(self):
+        return len(self.names)
+
+    def _insert(self, discord_id):
+        bucket = self.buckets.setdefault(self.counts.get(discord_id, 0), [])
+        self.slots[discord_id] = len(bucket)
+        bucket.append(discord_id)
+
+    def _remove(self, discord_id):
+        bucket = self.buckets[self.counts.get(discord_id, 0)]
+        i = self.slots.pop(discord_id)
+        last = bucket.pop()
+        if last != discord_id: # swap-remove keeps it O(1)
+            bucket[i] = last
+            self.slots[last] = i
+        if not bucket:
+            del self.buckets[self.counts.get(discord_id, 0)]
+
+    def add(self, discord_id, name):
+        if discord_id not in self.names:
+            self._insert(discord_id)
+        self.names[discord_id] = name
+
+    def pick(self, rng=random): #returns a discord_id, or None if nobody is checked in
+        if not self.buckets:
+            return None
+        least = min(self.buckets)
+        weights = {count: len(ids) * 2.0 ** (least - count) for count, ids in self.buckets.items()}
+        r = rng.random() * sum(weights.values())
+        for count, weight in weights.items():
+            r -= weight
+            if r < 0: break
+        return rng.choice(self.buckets[count])
+
+    def called(self, discord_id): # move the student to the next bucket after their count goes up
+        self._remove(discord_id)
+        self.counts[discord_id] = self.counts.get(discord_id, 0) + 1
+        self._insert(discord_id)
+
+class ColdCaller:
+    def __init__(self, db, classes=()):
+        self.db = db
+        self.terms = {} # course -> [(guild_id or None for any guild, first day, last day)] from the class config
+        for cl in classes:
+            self.terms.setdefault(cl["channel"], []).append((cl.get("guild_id"), parser.parse(cl["start_date"]).date().isoformat(),
+                                                             parser.parse(cl["end_date"]).date().isoformat()))
+        self.counts = {} # (guild_id, course, term's first day) -> {discord_id: times called}
+        self.rosters = {} # (guild_id, course, session_date) -> SessionRoster
+        self.today = None
+
+    def term(self, guild_id, course, session_date): #(first day, last day) of the class running on session_date
+        for guild, start, end in self.terms.get(course, ()):
+            if guild in (None, guild_id) and start <= session_date <= end:
+                return start, end
+        return "", "9999-12-31" # not a configured class: all of its history counts
+
+    def load(self, session_date=None): #restore today's rosters and the call history of the terms running today
+        session_date = session_date or datetime.now().strftime("%Y-%m-%d")
+        self._apply(session_date, self.db.read_sync(self._read, session_date))
+
+    async def reload(self, session_date=None): # load() with the queries on a worker thread, for use from the event loop
+        session_date = session_date or datetime.now().strftime("%Y-%m-%d")
+        self._apply(session_date, await self.db.read(self._read, session_date))
+
+    def _read(self, con, session_date):
+        counts = []
+        for course, ranges in self.terms.items():
+            for guild, start, end in ranges:
+                if start <= session_date <= end:
+                    counts += [(guild_id, course, start, discord_id, n) for guild_id, discord_id, n in con.execute(
+                        "select guild_id, discord_id, count(*) from coldcalls where course=? and session_date between ? and ? "
+                        "group by guild_id, discord_id", (course, start, end)) if guild in (None, guild_id)]
+        return counts, con.execute("select guild_id, course, discord_id, member from checkins where session_date=? order by rowid", (session_date,)).fetchall()
+
+    def _apply(self, session_date, rows):
+        counts, checked_in = rows
+        self.counts, self.rosters, self.today = {}, {}, session_date
+        for guild_id, course, start, discord_id, n in counts:
+            self.counts.setdefault((guild_id, course, start), {})[discord_id] = n
+        for guild_id, course, discord_id, member in checked_in:
+            self.roster(guild_id, course, session_date).add(discord_id, member or discord_id)
+
+    def roster(self, guild_id, course, session_date):
+        if session_date != self.today: # a new day: earlier rosters are done
+            self.rosters = {k: v for k, v in self.rosters.items() if k[2] >= session_date}
+            self.today = session_date
+        if (guild_id, course, session_date) not in self.rosters:
+            counts = self.counts.setdefault((guild_id, course, self.term(guild_id, course, session_date)[0]), {})
+            self.rosters[(guild_id, course, session_date)] = SessionRoster(counts)
+        return self.rosters[(guild_id, course, session_date)]
+
+    def add(self, guild_id, course, session_date, discord_id, name):
+        self.roster(guild_id, course, session_date).add(discord_id, name)
+
+    def pick(self, guild_id, course, session_date): #returns the chosen student's name and records the call, or None
+        roster = self.roster(guild_id, course, session_date)
+        discord_id = roster.pick()
+        if discord_id is None:
+            return None
+        roster.called(discord_id)
+        self.db.write_behind("insert into coldcalls (guild_id, course, discord_id, session_date, time) values (?,?,?,?,?)",
+                             (guild_id, course, discord_id, session_date, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        return roster.names[discord_id]
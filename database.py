@@ -0,0 +1,269 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from metrics import Metrics
+
+# One long-lived SQLite writer thread with group commit, plus a small pool of read connections.
+# Writes from every coroutine are queued; whatever piles up while a commit is in flight goes out
+# together in the next transaction, and each caller's future resolves only after that commit.
+
+# Schema versions are tracked with pragma user_version. Each step upgrades the database by one
+# version inside its own transaction, so running migrate() again (or on a fresh file) is a no-op.
+
+def _v1_checkins(con): # the table pandas' to_sql used to create, plus one check-in per student per session
+    con.execute('create table if not exists checkins (course TEXT, member TEXT, discord_id TEXT, time TEXT, "index" INTEGER)')
+    con.execute("delete from checkins where rowid not in (select min(rowid) from checkins group by course, date(time), discord_id)")
+    con.execute("create unique index if not exists checkins_session_member on checkins (course, date(time), discord_id)")
+
+def _v2_session_date(con): # explicit session_date column so queries can use plain indexes instead of date(time)
+    columns = [row[1] for row in con.execute("pragma table_info(checkins)")]
+    if "session_date" not in columns:
+        con.execute("alter table checkins add column session_date TEXT")
+    con.execute("update checkins set session_date=date(time) where session_date is null")
+    con.execute("drop index if exists checkins_session_member")
+    # the unique index also serves (course, session_date) lookups through its prefix
+    con.execute("create unique index if not exists checkins_course_session on checkins (course, session_date, discord_id)")
+    con.execute("create index if not exists checkins_course_member on checkins (course, discord_id)")
+
+def rebuild_rollups(con): # recompute the attendance counters from the raw checkins rows
+    con.execute("delete from course_sessions")
+    con.execute("delete from student_attendance")
+    con.execute("insert into course_sessions (guild_id, course, session_date, checkins) select guild_id, course, session_date, count(*) from checkins group by guild_id, course, session_date")
+    con.execute("insert into student_attendance (guild_id, course, discord_id, sessions) select guild_id, course, discord_id, count(*) from checkins group by guild_id, course, discord_id")
+
+def _v3_rollups(con): # counters kept up to date by each check-in so /attendance never rescans a course
+    con.execute("create table if not exists course_sessions (course TEXT, session_date TEXT, primary key (course, session_date))")
+    con.execute("create table if not exists student_attendance (course TEXT, discord_id TEXT, sessions INTEGER, primary key (course, discord_id))")
+    # filled by _v10_guild_ids, which rebuilds them in the current shape
+
+def _v4_polls(con): # poll definitions and votes, so live polls survive a restart
+    con.execute("create table if not exists polls (poll_id TEXT primary key, kind TEXT, question TEXT, options TEXT, author_id INTEGER, channel_id INTEGER, created TEXT, ended INTEGER default 0)")
+    con.execute("create index if not exists polls_open on polls (ended)")
+    con.execute("create table if not exists poll_votes (poll_id TEXT, user_id INTEGER, choice INTEGER, primary key (poll_id, user_id))")
+    con.execute("create table if not exists poll_answers (poll_id TEXT, user_id INTEGER, answer TEXT, primary key (poll_id, user_id))")
+
+def _v5_answer_journal(con): # open-ended answers moved to per-poll journal files (polls.AnswerJournal)
+    con.execute("drop table if exists poll_answers")
+
+def _v6_queues(con): # current contents of every help queue, restored at startup
+    con.execute("create table if not exists queue_entries (channel_id INTEGER, user_id INTEGER, name TEXT, seq INTEGER, primary key (channel_id, user_id))")
+
+def _v7_coldcalls(con): # cold-call history, so picks stay fair across restarts
+    con.execute("create table if not exists coldcalls (course TEXT, discord_id TEXT, session_date TEXT, time TEXT)")
+    con.execute("create index if not exists coldcalls_course_member on coldcalls (course, discord_id)")
+
+def _v8_command_sync(con): # hash of the command tree last synced to each guild (0: the global cleanup), so unchanged trees aren't re-synced
+    con.execute("create table if not exists command_sync (scope INTEGER primary key, hash TEXT)")
+
+def _v9_session_counts(con): # check-ins per session, for /attendance_report
+    columns = [row[1] for row in con.execute("pragma table_info(course_sessions)")]
+    if "checkins" not in columns:
+        con.execute("alter table course_sessions add column checkins INTEGER default 0")
+    # filled by _v10_guild_ids
+
+def _v10_guild_ids(con): # the same channel name in two guilds is two courses; 0 is a row from before this version
+    for table in ("checkins", "coldcalls"):
+        if "guild_id" not in [row[1] for row in con.execute(f"pragma table_info({table})")]:
+            con.execute(f"alter table {table} add column guild_id INTEGER not null default 0")
+    con.execute("drop index if exists checkins_course_session")
+    con.execute("drop index if exists checkins_course_member")
+    con.execute("create unique index if not exists checkins_guild_session on checkins (guild_id, course, session_date, discord_id)")
+    con.execute("create index if not exists checkins_guild_member on checkins (guild_id, course, discord_id)")
+    con.execute("drop index if exists coldcalls_course_member")
+    con.execute("create index if not exists coldcalls_guild_course on coldcalls (guild_id, course, session_date)")
+    # primary keys can't be altered, so the rollups are recreated and rebuilt
+    con.execute("drop table if exists course_sessions")
+    con.execute("drop table if exists student_attendance")
+    con.execute("create table course_sessions (guild_id INTEGER, course TEXT, session_date TEXT, checkins INTEGER default 0, primary key (guild_id, course, session_date))")
+    con.execute("create table student_attendance (guild_id INTEGER, course TEXT, discord_id TEXT, sessions INTEGER, primary key (guild_id, course, discord_id))")
+    rebuild_rollups(con)
+
+MIGRATIONS = [_v1_checkins, _v2_session_date, _v3_rollups, _v4_polls, _v5_answer_journal, _v6_queues, _v7_coldcalls, _v8_command_sync, _v9_session_counts, _v10_guild_ids]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def assign_guilds(con, classes): #gives rows from before v10 (guild_id 0) the guild of their class; returns the number of rows moved
+    # classes: [(guild_id, course, first day, last day)]. A row that would duplicate one already in
+    # that guild stays at 0, which keeps the unique index intact.
+    moved = 0
+    for guild_id, course, start, end in classes:
+        for table in ("checkins", "coldcalls"):
+            moved += con.execute(f"update or ignore {table} set guild_id=? where guild_id=0 and course=? and session_date between ? and ?",
+                                 (guild_id, course, start, end)).rowcount
+    if moved:
+        rebuild_rollups(con)
+    return moved
+
+def migrate(con):
+    isolation_level = con.isolation_level
+    con.isolation_level = None # DDL has to run inside the explicit transaction too
+    try:
+        version = con.execute("pragma user_version").fetchone()[0]
+        for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            con.execute("begin immediate")
+            try:
+                step(con)
+                con.execute(f"pragma user_version={target}")
+                con.execute("commit")
+            except Exception:
+                con.execute("rollback")
+                raise
+            print(f"classes.db schema upgraded to version {target}")
+        return con.execute("pragma user_version").fetchone()[0]
+    finally:
+        con.isolation_level = isolation_level
+
+class Database:
+    def __init__(self, path="classes.db", readers=4, batch_size=500, executor=None, metrics=None):
+        self.path = path
+        self.executor = executor # where read() runs its queries; None means the loop's default executor
+        self.metrics = metrics or Metrics() # a private registry when the caller doesn't collect them
+        self.batch_size = batch_size
+        self._writes = queue.Queue()
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(readers)
+        self._closed = False
+
+        con = self._connect()
+        # lets archive.py hand freed pages back without a full VACUUM; only takes effect on a new
+        # file, or an existing one at its next VACUUM (python archive.py --vacuum, with the bot stopped)
+        con.execute("pragma auto_vacuum=incremental")
+        con.execute("pragma journal_mode=WAL")
+        migrate(con)
+        con.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        con.execute("pragma synchronous=FULL") # a resolved write must survive a crash
+        con.execute("pragma busy_timeout=5000")
+        return con
+
+    # --- writes ---
+
+    def submit(self, job) -> Future: # job(con) runs inside the writer's transaction
+        if self._closed:
+            raise RuntimeError("database is closed")
+        done = Future()
+        self._writes.put((job, done, time.perf_counter()))
+        return done
+
+    def submit_sql(self, sql, params=()) -> Future:
+        return self.submit(lambda con: con.execute(sql, params).rowcount)
+
+    def write_behind(self, sql, params=()): # queue a write without waiting for it; failures are logged
+        done = self.submit_sql(sql, params)
+        def failed(f):
+            if f.exception():
+                self.metrics.inc("classy_db_write_behind_errors_total")
+                print(f"Write-behind failed: {f.exception()} ({sql})")
+        done.add_done_callback(failed)
+
+    async def write(self, job):
+        return await asyncio.wrap_future(self.submit(job))
+
+    async def execute(self, sql, params=()): # returns the rowcount once the row is committed
+        return await asyncio.wrap_future(self.submit_sql(sql, params))
+
+    def _write_loop(self):
+        con = self._connect()
+        con.isolation_level = None # transactions are managed explicitly in _commit
+        stopping = False
+        while not stopping:
+            item = self._writes.get()
+            if item is None: break
+            batch = [item]
+            while len(batch) < self.batch_size: #group commit: take everything that queued up meanwhile
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(con, batch)
+        con.close()
+
+    def _commit(self, con, batch):
+        results = []
+        started = time.perf_counter()
+        try:
+            con.execute("begin immediate")
+            for job, done, queued in batch:
+                con.execute("savepoint job")
+                try:
+                    results.append((done, job(con), None))
+                    con.execute("release job")
+                except Exception as e: # only this job is rolled back, the rest of the batch still commits
+                    con.execute("rollback to job")
+                    con.execute("release job")
+                    results.append((done, None, e))
+            con.execute("commit")
+        except Exception as e:
+            try: con.execute("rollback")
+            except sqlite3.Error: pass
+            for job, done, queued in batch:
+                if not done.done(): done.set_exception(e)
+            self._record(batch, started, "error")
+            return
+        self._record(batch, started, "ok", errors=sum(exc is not None for _, _, exc in results))
+        for done, result, exc in results:
+            if exc is not None: done.set_exception(exc)
+            else: done.set_result(result)
+
+    def _record(self, batch, started, status, errors=0):
+        now = time.perf_counter()
+        self.metrics.observe("classy_db_commit_seconds", now - started)
+        self.metrics.inc("classy_db_commits_total", status=status)
+        self.metrics.inc("classy_db_writes_total", len(batch) - errors, status=status)
+        if errors: self.metrics.inc("classy_db_writes_total", errors, status="error")
+        for job, done, queued in batch:
+            self.metrics.observe("classy_db_write_seconds", now - queued)
+
+    # --- reads ---
+
+    @contextmanager
+    def reader(self):
+        self._reader_slots.acquire()
+        try:
+            try:
+                con = self._readers.get_nowait()
+            except queue.Empty:
+                con = self._connect()
+                con.execute("pragma query_only=1")
+            try:
+                yield con
+            finally:
+                self._readers.put(con)
+        finally:
+            self._reader_slots.release()
+
+    def read_sync(self, fn, *args, **kwargs):
+        with self.metrics.timer("classy_db_read_seconds"), self.reader() as con:
+            return fn(con, *args, **kwargs)
+
+    async def read(self, fn, *args, **kwargs): # fn(con, ...) runs on a worker thread with a pooled connection
+        return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: self.read_sync(fn, *args, **kwargs))
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        self._writes.put(None)
+        self._writer.join()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+if __name__ == "__main__": # python database.py [path] upgrades an existing database in place
+    import sys
+    con = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "classes.db")
+    print(f"schema version {migrate(con)}")
+    con.close()
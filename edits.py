@@ -0,0 +1,42 @@
+import asyncio
+
+# Coalesces message.edit calls per message. The first edit goes out right away; edits requested
+# during the following cooldown replace each other, and only the latest is sent when it ends
+# (trailing edge). render() is called at send time, so it always reflects the current state.
+
+class EditCoalescer:
+    def __init__(self, interval=1.0):
+        self.interval = interval # minimum seconds between edits of the same message
+        self.pending = {} # message id -> (message, render, on_error)
+        self.tasks = {} # message id -> flush task
+        self.requested = 0
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def saved(self): # edits that were requested but made unnecessary by a later one
+        return self.requested - self.sent - self.failed - len(self.pending)
+
+    def edit(self, message, render, on_error=None): #render() returns the keyword arguments for message.edit
+        self.requested += 1
+        self.pending[message.id] = (message, render, on_error)
+        if message.id not in self.tasks:
+            self.tasks[message.id] = asyncio.create_task(self._flush(message.id))
+
+    def discard(self, message_id): # drop a pending edit, e.g. before a poll's final edit
+        self.pending.pop(message_id, None)
+
+    async def _flush(self, message_id):
+        try:
+            while message_id in self.pending:
+                message, render, on_error = self.pending.pop(message_id)
+                try:
+                    await message.edit(**render())
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    if on_error: on_error(e)
+                    else: print(f"Error editing message: {e}")
+                await asyncio.sleep(self.interval)
+        finally:
+            del self.tasks[message_id]
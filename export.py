@@ -0,0 +1,95 @@
+import csv
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Attendance CSV export straight from SQLite. Only per-student totals and the session list are held
+# in memory; the student x session matrix is built a chunk of students at a time and written as it goes.
+# The output matches what the old pandas pivot produced: discord_id, member, one 0/1 column per
+# session date, total, percent.
+
+CHUNK = 200 # students per matrix chunk
+
+STUDENTS_SQL = """
+    select discord_id, count(distinct session_date) as total,
+        (select member from checkins n where n.guild_id=c.guild_id and n.course=c.course and n.discord_id=c.discord_id
+            and n.member is not null and n.member != '' order by n.session_date desc limit 1) as member
+    from checkins c where guild_id=? and course=? group by discord_id
+"""
+
+def percent(total, n_sessions): # same rounding as pandas' Series.round(1)
+    return round(total / n_sessions * 100 * 10) / 10
+
+def export_course(con, guild_id, course, filename): #returns (sessions, students), or None if the course has no check-ins
+    sessions = [row[0] for row in con.execute(
+        "select distinct session_date from checkins where guild_id=? and course=? order by session_date", (guild_id, course))]
+    if not sessions:
+        return None
+    column = {d: i for i, d in enumerate(sessions)}
+
+    students = con.execute(STUDENTS_SQL, (guild_id, course)).fetchall()
+    students.sort(key=lambda s: (-s[1], s[2] or "", s[0]))
+
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator=os.linesep)
+        writer.writerow(["discord_id", "member"] + sessions + ["total", "percent"])
+        for i in range(0, len(students), CHUNK):
+            chunk = students[i:i + CHUNK]
+            present = {s[0]: [0] * len(sessions) for s in chunk}
+            marks = ",".join("?" * len(chunk))
+            for discord_id, session_date in con.execute(
+                    f"select discord_id, session_date from checkins where guild_id=? and course=? and discord_id in ({marks})",
+                    [guild_id, course] + [s[0] for s in chunk]):
+                present[discord_id][column[session_date]] = 1
+            writer.writerows([discord_id, member or ""] + present[discord_id] + [total, percent(total, len(sessions))]
+                             for discord_id, total, member in chunk)
+    return len(sessions), len(students)
+
+class CourseMatrix: # one course's attendance, accumulated from rows ordered by discord_id then session_date
+    def __init__(self, course):
+        self.course = course
+        self.sessions = set()
+        self.present = {} # discord_id -> set of session dates
+        self.names = {} # discord_id -> most recent non-empty display name
+
+    def add(self, discord_id, session_date, member):
+        self.sessions.add(session_date)
+        self.present.setdefault(discord_id, set()).add(session_date)
+        if member: self.names[discord_id] = member
+
+    def write(self, filename):
+        sessions = sorted(self.sessions)
+        students = sorted(((discord_id, len(dates), self.names.get(discord_id, "")) for discord_id, dates in self.present.items()),
+                          key=lambda s: (-s[1], s[2], s[0]))
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(["discord_id", "member"] + sessions + ["total", "percent"])
+            for discord_id, total, member in students:
+                dates = self.present[discord_id]
+                writer.writerow([discord_id, member] + [int(d in dates) for d in sessions] + [total, percent(total, len(sessions))])
+        return filename, len(sessions), len(students)
+
+def export_term(con, guild_id, courses, directory, zip_name, workers=4): #returns (zip path, {course: (sessions, students)})
+    # a single pass over one guild's checkins in (guild_id, course, discord_id) index order; each
+    # course is handed to a writer thread as soon as the scan moves past it
+    marks = ",".join("?" * len(courses))
+    rows = con.execute(f"select course, discord_id, session_date, member from checkins where guild_id=? and course in ({marks}) "
+                       "order by course, discord_id, session_date", [guild_id] + list(courses))
+    pending = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        matrix = None
+        for course, discord_id, session_date, member in rows:
+            if matrix is None or course != matrix.course:
+                if matrix: pending.append(pool.submit(matrix.write, os.path.join(directory, f"{matrix.course}.csv")))
+                matrix = CourseMatrix(course)
+            matrix.add(discord_id, session_date, member)
+        if matrix: pending.append(pool.submit(matrix.write, os.path.join(directory, f"{matrix.course}.csv")))
+        written = [p.result() for p in pending]
+
+    results = {}
+    zip_path = os.path.join(directory, zip_name)
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for filename, n_sessions, n_students in written:
+            z.write(filename, arcname=os.path.basename(filename))
+            results[os.path.splitext(os.path.basename(filename))[0]] = (n_sessions, n_students)
+    return zip_path, results
@@ -0,0 +1,74 @@
+# Name -> object indexes for each guild's members, roles and channels, so by-name lookups don't
+# scan guild.members/roles/channels. Built once per guild on ready and kept current from gateway
+# events. Names aren't unique; like discord.utils.get, a lookup returns the earliest one indexed.
+
+class NameIndex:
+    def __init__(self):
+        self.by_name = {} # name -> {id: object}
+        self.names = {} # id -> name it is indexed under
+
+    def add(self, obj):
+        self.remove(obj.id)
+        self.by_name.setdefault(obj.name, {})[obj.id] = obj
+        self.names[obj.id] = obj.name
+
+    def remove(self, obj_id):
+        name = self.names.pop(obj_id, None)
+        if name is None: return
+        objs = self.by_name[name]
+        del objs[obj_id]
+        if not objs: del self.by_name[name]
+
+    def get(self, name):
+        objs = self.by_name.get(name)
+        return next(iter(objs.values())) if objs else None
+
+class GuildIndex:
+    def __init__(self, guild):
+        self.members, self.roles, self.channels = NameIndex(), NameIndex(), NameIndex()
+        for m in guild.members: self.members.add(m)
+        for r in guild.roles: self.roles.add(r)
+        for c in guild.channels: self.channels.add(c)
+
+class GuildCache:
+    def __init__(self):
+        self.guilds = {} # guild id -> GuildIndex
+
+    def index(self, guild): # (re)build a guild's indexes, e.g. on ready or when joining it
+        self.guilds[guild.id] = GuildIndex(guild)
+
+    def forget(self, guild):
+        self.guilds.pop(guild.id, None)
+
+    def _guild(self, guild):
+        if guild.id not in self.guilds:
+            self.index(guild)
+        return self.guilds[guild.id]
+
+    def member(self, guild, name):
+        return self._guild(guild).members.get(name)
+
+    def role(self, guild, name):
+        return self._guild(guild).roles.get(name)
+
+    def channel(self, guild, name):
+        return self._guild(guild).channels.get(name)
+
+    # event hooks
+    def member_changed(self, member): # join, update, or a username change
+        self._guild(member.guild).members.add(member)
+
+    def member_removed(self, member):
+        self._guild(member.guild).members.remove(member.id)
+
+    def role_changed(self, role):
+        self._guild(role.guild).roles.add(role)
+
+    def role_removed(self, role):
+        self._guild(role.guild).roles.remove(role.id)
+
+    def channel_changed(self, channel):
+        self._guild(channel.guild).channels.add(channel)
+
+    def channel_removed(self, channel):
+        self._guild(channel.guild).channels.remove(channel.id)
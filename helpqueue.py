@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from itertools import islice
+
+# Help queues keyed by channel id. Each entry is (user id, display name at join time), so nothing
+# holds on to discord.Member objects. Join, leave and next are O(1) on an OrderedDict (a linked
+# list with an id index); positions come from a Fenwick tree over join tickets in O(log n).
+
+PER_PAGE = 40 # 40 lines of "NNN. <32 character name>" stay well under Discord's 2000 characters
+
+class HelpQueue:
+    def __init__(self):
+        self.entries = OrderedDict() # user id -> (ticket, name), in queue order
+        self._reset(64)
+
+    def _reset(self, capacity): # renumber tickets 0..n-1 into a fresh tree
+        self._capacity = capacity
+        self._tree = [0] * (capacity + 1)
+        self._next = 0
+        for user_id, (ticket, name) in list(self.entries.items()):
+            self.entries[user_id] = (self._next, name)
+            self._mark(self._next, 1)
+            self._next += 1
+
+    def _mark(self, ticket, delta):
+        i = ticket + 1
+        while i <= self._capacity:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_through(self, ticket): # live tickets <= ticket
+        i, total = ticket + 1, 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, user_id):
+        return user_id in self.entries
+
+    def join(self, user_id, name): #returns the new position, or None if already queued
+        if user_id in self.entries:
+            return None
+        if self._next == self._capacity:
+            self._reset(max(64, 2 * (len(self.entries) + 1)))
+        self.entries[user_id] = (self._next, name)
+        self._mark(self._next, 1)
+        self._next += 1
+        return len(self.entries)
+
+    def leave(self, user_id):
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._mark(entry[0], -1)
+        return True
+
+    def next(self): #returns (user id, name) of whoever is first, or None
+        if not self.entries:
+            return None
+        user_id, (ticket, name) = self.entries.popitem(last=False)
+        self._mark(ticket, -1)
+        return user_id, name
+
+    def position(self, user_id):
+        entry = self.entries.get(user_id)
+        return self._count_through(entry[0]) if entry else None
+
+    def clear(self):
+        self.entries.clear()
+        self._reset(64)
+
+    def pages(self):
+        return max(1, -(-len(self.entries) // PER_PAGE))
+
+    def render(self, page=1):
+        start = (page - 1) * PER_PAGE
+        msg = "**Current Queue:**\n"
+        if not self.entries:
+            return msg + "The queue is empty."
+        for i, (ticket, name) in enumerate(islice(self.entries.values(), start, start + PER_PAGE), start=start + 1):
+            msg += f"{i}. {name}\n"
+        if self.pages() > 1:
+            msg += f"Page {page} of {self.pages()} ({len(self.entries)} in queue)"
+        return msg
+
+class QueueManager:
+    # Every change is also written behind to the queue_entries table, which always holds the current
+    # queues, so they can be restored after a restart.
+    def __init__(self, db):
+        self.db = db
+        self.queues = {} # channel id -> HelpQueue
+        self.seq = 0 # ordering value for queue_entries rows
+
+    def load(self):
+        rows = self.db.read_sync(lambda con: con.execute(
+            "select channel_id, user_id, name, seq from queue_entries order by seq").fetchall())
+        for channel_id, user_id, name, seq in rows:
+            self.get(channel_id).join(user_id, name)
+            self.seq = seq + 1
+
+    def get(self, channel_id):
+        if channel_id not in self.queues:
+            self.queues[channel_id] = HelpQueue()
+        return self.queues[channel_id]
+
+    def join(self, channel_id, user_id, name):
+        position = self.get(channel_id).join(user_id, name)
+        if position is not None:
+            self.db.write_behind("insert or replace into queue_entries (channel_id, user_id, name, seq) values (?,?,?,?)",
+                                 (channel_id, user_id, name, self.seq))
+            self.seq += 1
+        return position
+
+    def leave(self, channel_id, user_id):
+        if not self.get(channel_id).leave(user_id):
+            return False
+        self.db.write_behind("delete from queue_entries where channel_id=? and user_id=?", (channel_id, user_id))
+        return True
+
+    def next(self, channel_id):
+        entry = self.get(channel_id).next()
+        if entry:
+            self.db.write_behind("delete from queue_entries where channel_id=? and user_id=?", (channel_id, entry[0]))
+        return entry
+
+    def clear(self, channel_id):
+        self.get(channel_id).clear()
+        self.db.write_behind("delete from queue_entries where channel_id=?", (channel_id,))
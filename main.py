@@ -1,40 +1,88 @@
 
 import asyncio
+import csv
+import hashlib
 import json
 import discord
+import io
+import logging
 import os
 from datetime import datetime
-from dateutil import parser
 import time
-import pytz
 import random
+import tempfile
 from discord.ext import commands
-import sqlite3
-import pandas as pd
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+from schedule import ScheduleIndex, EventScheduler
+from database import Database, assign_guilds
+from checkins import CheckinStore
+from polls import PollStore, AnswerJournal
+from helpqueue import QueueManager
+from coldcall import ColdCaller
+from guildcache import GuildCache
+from roster import MemberUpdater, RosterJournal, RosterImport, parse_roster
+from export import export_course, export_term
+import archive
+from offload import Offload, LoopLagMonitor, NO_TIMEOUT
+import charts
+import reports
+from edits import EditCoalescer
+from summarize import Summarizer, GeminiModel, gemini_available
+from metrics import Metrics
+# pandas, matplotlib and google.generativeai are slow to import, so each is only imported where it is used
+if not gemini_available():
     print("google-generativeai library not found. AI features will be disabled.")
-try:
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-    import io
-except ImportError:
-    plt = None
-    print("matplotlib library not found. Charts will be disabled.")
 
 config = json.loads(open("config.json").read())
 classes = config["classes"]
+schedule_index = ScheduleIndex(classes)
 perms = discord.Permissions(8)
 intents = discord.Intents.default()
 intents.members = True
 intents.messages = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix='!',intents=intents)
-queues = {} # channel_id -> list of members
+metrics = Metrics()
+
+def command_finished(interaction, status):
+    name = interaction.command.qualified_name if interaction.command else "unknown"
+    started = interaction.extras.get("started")
+    if started is not None:
+        metrics.observe("classy_command_seconds", time.perf_counter() - started, command=name)
+    metrics.inc("classy_commands_total", command=name, status=status)
+
+class CommandTree(discord.app_commands.CommandTree): # times every app command
+    async def interaction_check(self, interaction: discord.Interaction):
+        interaction.extras["started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error):
+        command_finished(interaction, "error")
+        await super().on_error(interaction, error)
+
+# one process can serve many guilds; set shard_count/shard_ids to split them across processes
+bot = commands.AutoShardedBot(command_prefix='!',intents=intents,shard_count=config.get("shard_count"),shard_ids=config.get("shard_ids"),tree_cls=CommandTree)
+
+def instrument_http(): # time every Discord API call, labelled by its route template (not the ids in it)
+    request = bot.http.request
+    async def timed_request(route, **kwargs):
+        t = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        except discord.HTTPException as e:
+            metrics.inc("classy_http_errors_total", method=route.method, route=route.path, status=e.status)
+            raise
+        finally:
+            metrics.observe("classy_http_seconds", time.perf_counter() - t, method=route.method, route=route.path)
+    bot.http.request = timed_request
+
+class RateLimitCounter(logging.Handler): # discord.py waits out 429s itself and only logs them
+    def emit(self, record):
+        # one warning per 429 response; a global one also logs "Global rate limit has been hit", which isn't counted again
+        if "responded with 429" in str(record.msg):
+            metrics.inc("classy_http_rate_limited_total")
+
+instrument_http()
+logging.getLogger("discord.http").addHandler(RateLimitCounter(logging.WARNING))
 queue_messages = {} # channel_id -> discord.Message
 
 async def update_queue_display(channel_id):
@@ -42,57 +90,96 @@ async def update_queue_display(channel_id):
         return
     
     message = queue_messages[channel_id]
-    q = queues.get(channel_id, [])
-    
-    msg = "**Current Queue:**\n"
-    if not q:
-        msg += "The queue is empty."
-    else:
-        for i, member in enumerate(q):
-            msg += f"{i+1}. {member.display_name}\n"
-            
-    try:
-        await message.edit(content=msg)
-    except (discord.NotFound, discord.HTTPException):
-        if channel_id in queue_messages:
-            del queue_messages[channel_id]
 
-def db_connection():
-    return sqlite3.connect("classes.db")
+    def render():
+        return {"content": queues.get(channel_id).render()}
 
-def get_period(channel: str): #if the period is active, it'll return the period, otherwise it'll return None
-    for cl in classes:
+    def on_error(e):
+        if isinstance(e, (discord.NotFound, discord.HTTPException)) and queue_messages.get(channel_id) is message:
+            del queue_messages[channel_id]
 
-        if cl["channel"] != channel: continue #this is not the channel you are looking for (probably should have used a dictionary)
+    edits.edit(message, render, on_error)
+
+offload = Offload()
+offload.start() # before any other threads exist, see offload.py
+loop_lag = LoopLagMonitor()
+poll_charts = charts.ChartCache()
+report_charts = charts.ChartCache(size=32) # keyed by each course's check-in totals, so a new check-in means a new report
+edits = EditCoalescer(config.get("edit_interval", 1.0))
+summarizer = None
+if gemini_available() and "gemini_api_key" in config:
+    summarizer = Summarizer(GeminiModel(config["gemini_api_key"], 'gemini-3-flash-preview'), run=offload.run_io)
+db = Database("classes.db", executor=offload.io, metrics=metrics)
+checkins = CheckinStore(db)
+checkins.load()
+polls = PollStore(db)
+queues = QueueManager(db) # channel_id -> HelpQueue
+queues.load()
+coldcaller = ColdCaller(db, classes)
+coldcaller.load()
+guild_cache = GuildCache()
+member_updates = MemberUpdater() # shared by /register and roster imports, so they queue behind the same limits
+
+metrics.gauge("classy_uptime_seconds", lambda: round(time.time() - metrics.started), "Seconds since the bot started")
+metrics.gauge("classy_loop_lag_max_seconds", lambda: loop_lag.max_lag, "Worst event loop lag seen")
+metrics.gauge("classy_loop_stalls", lambda: loop_lag.stalls, "Event loop stalls longer than the lag threshold")
+metrics.gauge("classy_offload_timeouts", lambda: offload.timeouts, "Offloaded jobs that timed out")
+metrics.gauge("classy_edits_requested", lambda: edits.requested, "Message edits requested")
+metrics.gauge("classy_edits_sent", lambda: edits.sent, "Message edits sent after coalescing")
+metrics.gauge("classy_edits_failed", lambda: edits.failed, "Message edits that failed")
+metrics.gauge("classy_edits_saved", lambda: edits.saved, "Message edits made unnecessary by a later one")
+metrics.gauge("classy_chart_cache_hits", lambda: poll_charts.hits, "Poll charts served from the cache")
+metrics.gauge("classy_chart_cache_misses", lambda: poll_charts.misses, "Poll charts rendered")
+metrics.gauge("classy_report_cache_hits", lambda: report_charts.hits, "Attendance reports served from the cache")
+metrics.gauge("classy_report_cache_misses", lambda: report_charts.misses, "Attendance reports built")
+metrics.gauge("classy_member_update_retries", lambda: member_updates.retried, "Role and nickname updates retried after a rate limit or server error")
+
+def read_sql(con, sql, params): # runs on a worker thread, which also takes the first pandas import off the loop
+    import pandas as pd
+    return pd.read_sql(sql, con, params=params)
+
+def write_csv(rows, filename):
+    import pandas as pd
+    pd.DataFrame(rows).to_csv(filename, index=False)
+
+def get_period(channel): #if the period is active, it'll return the period, otherwise it'll return None
+    guild = getattr(channel, "guild", None)
+    return schedule_index.get_period(channel.name, guild_id=guild.id if guild else None, channel_id=channel.id)
+
+def guild_classes(guild_id): # classes that belong to a guild: configured for it, or not tied to one
+    return [cl for cl in classes if cl.get("guild_id") in (None, guild_id)]
+
+def pinned(cl): # tied to one guild by id; other classes run in every guild with a channel of their name
+    return bool(cl.get("guild_id") or cl.get("channel_id"))
+
+def class_guild(cl): #the guild a pinned class lives in, or None if it isn't served by this process's shards
+    if cl.get("guild_id"):
+        return bot.get_guild(cl["guild_id"])
+    if cl.get("channel_id"): # ids are unique across guilds, so the channel alone says which one
+        channel = bot.get_channel(cl["channel_id"])
+        return channel.guild if channel else None
+    return None
 
-        lt = datetime.now().astimezone(tz=pytz.timezone(cl["tz"]))
-        dayname = lt.strftime("%A").lower()
-        current_day = lt.date()
-        start_day = parser.parse(cl["start_date"]).date()
-        end_day = parser.parse(cl["end_date"]).date()
-        exceptions = [parser.parse(d).date() for d in cl["exceptions"]]
-        if (current_day < start_day) or (current_day > end_day) or (current_day in exceptions): continue
+def class_guilds(cl): #the guilds this process serves that a class runs in
+    if pinned(cl):
+        guild = class_guild(cl)
+        return [guild] if guild else []
+    return [guild for guild in bot.guilds if guild_cache.channel(guild, cl["channel"])]
 
-        #check the periods
-        for period in cl["periods"]:
-            start_time = datetime.strptime(period["start"],"%I:%M %p").time()
-            end_time = datetime.strptime(period['end'],"%I:%M %p").time()
-            if (period["day"] == dayname) and (lt.time() >= start_time) and (lt.time() < end_time):
-                return period
-    return None
+def class_channel(cl, guild):
+    if cl.get("channel_id"):
+        return guild.get_channel(cl["channel_id"])
+    return guild_cache.channel(guild, cl["channel"])
 
 @bot.tree.command(name="checkin", description="Check in to the current class")
 async def checkin(interaction: discord.Interaction):
     channel = interaction.channel
     member = interaction.user
-    period = get_period(channel.name)
+    period = get_period(channel)
     if period:
-        if member.name not in period["checked_in"]:
-            with db_connection() as con:
-                nick = member.nick if hasattr(member, "nick") and member.nick else member.name
-                df = pd.DataFrame({"course":[channel.name],"member":[nick],"discord_id":[member.name],"time":[datetime.now().strftime("%Y-%m-%d %H:%M:%S")],"index":[0]})
-                df.to_sql("checkins",con,index=False,if_exists='append')
-            period["checked_in"].append(member.name)
+        nick = member.nick if hasattr(member, "nick") and member.nick else member.name
+        if await checkins.check_in(interaction.guild_id, channel.name, nick, member.name):
+            coldcaller.add(interaction.guild_id, channel.name, datetime.now().strftime("%Y-%m-%d"), member.name, nick)
             await interaction.response.send_message("You are checked in", ephemeral=True)
         else:
             await interaction.response.send_message("You were already checked in", ephemeral=True)
@@ -106,37 +193,30 @@ async def attendance(interaction: discord.Interaction):
     member = interaction.user
 
     if hasattr(member, "roles") and discord.utils.get(member.roles, name="Admin"): 
-        with db_connection() as con:
-            df = pd.read_sql("select distinct member from checkins where course=? and date(time)=?",con,params=(channel.name,datetime.now().strftime("%Y-%m-%d")))
-            await interaction.response.send_message(f"```{df.to_string(index=False)}```", ephemeral=True)
+        df = await db.read(read_sql, "select distinct member from checkins where guild_id=? and course=? and session_date=?",
+                           (interaction.guild_id, channel.name, datetime.now().strftime("%Y-%m-%d")))
+        await interaction.response.send_message(f"```{df.to_string(index=False)}```", ephemeral=True)
     else:
-        with db_connection() as con:
-            dates_df = pd.read_sql(
-                "select distinct date(time) as date from checkins where course=? and discord_id=? order by date",
-                con, params=(channel.name, member.name))
-            counts_df = pd.read_sql(
-                "select discord_id, count(distinct date(time)) as cnt from checkins where course=? group by discord_id",
-                con, params=(channel.name,))
-            total_sessions_df = pd.read_sql(
-                "select count(distinct date(time)) as cnt from checkins where course=?",
-                con, params=(channel.name,))
-
-        total_sessions = int(total_sessions_df["cnt"].iloc[0]) if not total_sessions_df.empty else 0
-        my_count = len(dates_df)
+        stats = checkins.rollup(interaction.guild_id, channel.name)
+        total_sessions = stats.sessions
+        my_count = stats.count(member.name)
 
         if total_sessions == 0:
             await interaction.response.send_message("No class sessions have been recorded yet.", ephemeral=True)
             return
 
-        n_students = len(counts_df)
-        avg = float(counts_df["cnt"].mean()) if n_students else 0.0
+        n_students = len(stats.students)
+        avg = stats.average()
         if my_count > 0:
-            rank = int((counts_df["cnt"] > my_count).sum()) + 1
+            rank = stats.rank(my_count)
             rank_text = f"Rank: **{rank} of {n_students}** (class average: {avg:.1f})"
         else:
             rank_text = f"You have no recorded check-ins yet (class average: {avg:.1f})."
 
-        dates_str = dates_df["date"].to_string(index=False) if my_count > 0 else "(none)"
+        dates = await db.read(lambda con: [row[0] for row in con.execute(
+            "select session_date from checkins where guild_id=? and course=? and discord_id=? order by session_date",
+            (interaction.guild_id, channel.name, member.name))]) if my_count > 0 else []
+        dates_str = "\n".join(dates) if dates else "(none)"
         msg = (
             f"**Your attendance for {channel.name}**\n"
             f"```\n{dates_str}\n```\n"
@@ -145,8 +225,8 @@ async def attendance(interaction: discord.Interaction):
         )
         await interaction.response.send_message(msg, ephemeral=True)
 
-@bot.tree.command(name="export_attendance", description="Export full class attendance as CSV (Admin only)")
-async def export_attendance(interaction: discord.Interaction):
+@bot.tree.command(name="attendance_report", description="Attendance trends for this class (Admin only)")
+async def attendance_report(interaction: discord.Interaction):
     member = interaction.user
     channel = interaction.channel
 
@@ -154,60 +234,126 @@ async def export_attendance(interaction: discord.Interaction):
         await interaction.response.send_message("Only admins can use this.", ephemeral=True)
         return
 
-    await interaction.response.defer(ephemeral=True)
-
-    with db_connection() as con:
-        df = pd.read_sql(
-            "select discord_id, member, date(time) as date from checkins where course=?",
-            con, params=(channel.name,))
+    stats = checkins.rollup(interaction.guild_id, channel.name)
+    if stats.sessions == 0:
+        await interaction.response.send_message("No class sessions have been recorded yet.", ephemeral=True)
+        return
 
-    if df.empty:
-        await interaction.followup.send("No checkin records for this course.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True)
+    async def render():
+        dates, counts, attended = await db.read(reports.read_report_data, interaction.guild_id, channel.name)
+        return await offload.run_cpu(reports.build_report, channel.name, dates, counts, attended, charts.available, timeout=10)
+    try:
+        summary, png = await report_charts.get((interaction.guild_id, channel.name, stats.sessions, stats.total), render)
+    except Exception as e:
+        await interaction.followup.send(f"Could not build the report: {e!r}", ephemeral=True)
         return
 
-    # Use the most recent non-empty display name for each discord_id
-    named = df[df["member"].notna() & (df["member"].astype(str) != "")]
-    latest_names = named.sort_values("date").groupby("discord_id")["member"].last()
+    if png:
+        await interaction.followup.send(summary, file=discord.File(io.BytesIO(png), filename="attendance_report.png"), ephemeral=True)
+    else:
+        await interaction.followup.send(summary, ephemeral=True)
+
+@bot.tree.command(name="export_attendance", description="Export full class attendance as CSV (Admin only)")
+async def export_attendance(interaction: discord.Interaction):
+    member = interaction.user
+    channel = interaction.channel
 
-    df["present"] = 1
-    pivot = (df.drop_duplicates(["discord_id", "date"])
-               .pivot(index="discord_id", columns="date", values="present")
-               .fillna(0).astype(int))
-    pivot = pivot.reindex(sorted(pivot.columns), axis=1)
+    if not (hasattr(member, "roles") and discord.utils.get(member.roles, name="Admin")):
+        await interaction.response.send_message("Only admins can use this.", ephemeral=True)
+        return
 
-    n_sessions = pivot.shape[1]
-    pivot["total"] = pivot.sum(axis=1)
-    pivot["percent"] = (pivot["total"] / n_sessions * 100).round(1)
-    pivot.insert(0, "member", pivot.index.map(latest_names).fillna(""))
-    pivot = pivot.sort_values(["total", "member"], ascending=[False, True])
+    await interaction.response.defer(ephemeral=True)
 
     if not os.path.exists("exports"):
         os.makedirs("exports")
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"exports/{channel.name}_{timestamp}.csv"
-    pivot.to_csv(filename)
+    terms = archive.archived_terms(classes, channel.name)
+    try:
+        if terms: # the course's earlier terms have been archived; read them alongside the live rows
+            result = await offload.run_io(archive.read, "classes.db", terms, export_course, interaction.guild_id, channel.name, filename, timeout=NO_TIMEOUT)
+        else:
+            result = await db.read(export_course, interaction.guild_id, channel.name, filename)
+    except Exception as e:
+        await interaction.followup.send(f"Could not export attendance: {e}", ephemeral=True)
+        return
 
-    summary = f"**Attendance export for {channel.name}**\nSessions: {n_sessions} | Students: {len(pivot)}"
+    if result is None:
+        await interaction.followup.send("No checkin records for this course.", ephemeral=True)
+        return
+    n_sessions, n_students = result
+
+    summary = f"**Attendance export for {channel.name}**\nSessions: {n_sessions} | Students: {n_students}"
     try:
         await interaction.user.send(summary, file=discord.File(filename))
         await interaction.followup.send(f"Sent to your DMs. Saved at `{filename}`.", ephemeral=True)
     except Exception as e:
         await interaction.followup.send(f"Could not DM ({e}). File saved at `{filename}`.", ephemeral=True)
 
+@bot.tree.command(name="export_term", description="Export attendance for every class as one zip (Admin only)")
+@discord.app_commands.describe(courses="Comma separated list of class channels (default: all classes)")
+async def export_term_attendance(interaction: discord.Interaction, courses: str = None):
+    member = interaction.user
+
+    if not (hasattr(member, "roles") and discord.utils.get(member.roles, name="Admin")):
+        await interaction.response.send_message("Only admins can use this.", ephemeral=True)
+        return
+
+    all_courses = list(dict.fromkeys(cl["channel"] for cl in guild_classes(interaction.guild_id)))
+    selected = [c.strip() for c in courses.split(",") if c.strip()] if courses else all_courses
+    unknown = [c for c in selected if c not in all_courses]
+    if unknown or not selected:
+        await interaction.response.send_message(f"Unknown classes: {', '.join(unknown) or '(none given)'}", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs("exports", exist_ok=True)
+    directory = tempfile.mkdtemp(prefix=f"term_{timestamp}_", dir="exports") # unique, so two exports in the same second don't collide
+    terms = sorted({t for course in selected for t in archive.archived_terms(classes, course)})
+    try:
+        if terms:
+            zip_path, results = await offload.run_io(archive.read, "classes.db", terms, export_term, interaction.guild_id, selected, directory,
+                                                     f"attendance_{timestamp}.zip", timeout=NO_TIMEOUT)
+        else:
+            zip_path, results = await db.read(export_term, interaction.guild_id, selected, directory, f"attendance_{timestamp}.zip")
+    except Exception as e:
+        await interaction.followup.send(f"Could not export attendance: {e}", ephemeral=True)
+        return
+
+    if not results:
+        await interaction.followup.send("No checkin records for these courses.", ephemeral=True)
+        return
+
+    summary = "**Term attendance export**\n" + "\n".join(
+        f"{course}: " + (f"Sessions: {results[course][0]} | Students: {results[course][1]}" if course in results else "no records")
+        for course in selected)
+    if len(summary) > 2000:
+        summary = summary[:1990] + "..."
+    try:
+        await interaction.user.send(summary, file=discord.File(zip_path))
+        await interaction.followup.send(f"Sent to your DMs. Saved at `{zip_path}`.", ephemeral=True)
+    except Exception as e:
+        await interaction.followup.send(f"Could not DM ({e}). File saved at `{zip_path}`.", ephemeral=True)
+
 class PollView(discord.ui.View):
-    def __init__(self, question: str, options: list[str], author: discord.Member):
+    def __init__(self, poll_id: str, question: str, options: list[str], author_id: int, votes: dict = None):
         super().__init__(timeout=None)
+        self.poll_id = poll_id
         self.question = question
         self.options = options
-        self.author = author
-        self.votes = {} 
+        self.author_id = author_id
+        self.votes = votes or {}
 
+        # custom_ids are unique per poll so bot.add_view can route clicks back after a restart
         for i, option in enumerate(options):
-            button = discord.ui.Button(label=option, style=discord.ButtonStyle.primary, custom_id=f"poll_btn_{i}")
+            button = discord.ui.Button(label=option, style=discord.ButtonStyle.primary, custom_id=f"poll:{poll_id}:{i}")
             button.callback = self.create_callback(i, option)
             self.add_item(button)
         
-        end_btn = discord.ui.Button(label="End Poll", style=discord.ButtonStyle.danger, row=4, custom_id="poll_end")
+        end_btn = discord.ui.Button(label="End Poll", style=discord.ButtonStyle.danger, row=4, custom_id=f"poll:{poll_id}:end")
         end_btn.callback = self.end_poll_callback
         self.add_item(end_btn)
 
@@ -217,20 +363,22 @@ class PollView(discord.ui.View):
                 await interaction.response.send_message("You have already voted.", ephemeral=True)
                 return
             self.votes[interaction.user.id] = index
+            polls.vote(self.poll_id, interaction.user.id, index)
             await interaction.response.send_message(f"Vote recorded for: {label}", ephemeral=True)
             
-            try:
+            def render():
                 embed = interaction.message.embeds[0]
                 embed.set_footer(text=f"Total Votes: {len(self.votes)}")
-                await interaction.message.edit(embed=embed)
-            except Exception as e:
-                print(f"Error updating vote count: {e}")
+                return {"embed": embed}
+            edits.edit(interaction.message, render, lambda e: print(f"Error updating vote count: {e}"))
         return callback
 
     async def end_poll_callback(self, interaction: discord.Interaction):
-        if interaction.user.id != self.author.id:
+        if interaction.user.id != self.author_id:
             await interaction.response.send_message("Only the poll creator can end this poll.", ephemeral=True)
             return
+        polls.end(self.poll_id)
+        self.stop()
 
         counts = {i: 0 for i in range(len(self.options))}
         for v in self.votes.values():
@@ -242,23 +390,17 @@ class PollView(discord.ui.View):
         
         for child in self.children:
             child.disabled = True
+        edits.discard(interaction.message.id) # a late vote count must not overwrite the results
         
         file = None
-        if plt:
+        if charts.available:
             try:
-                plt.figure(figsize=(6, 4))
-                plt.bar(self.options, [counts[i] for i in range(len(self.options))])
-                plt.title(self.question)
-                plt.ylabel("Votes")
-                plt.xticks(rotation=45, ha='right')
-                plt.tight_layout()
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png')
-                buf.seek(0)
-                file = discord.File(buf, filename='poll_chart.png')
-                plt.close()
+                values = tuple(counts[i] for i in range(len(self.options)))
+                png = await poll_charts.get((self.question, tuple(self.options), values), lambda: offload.run_cpu(
+                    charts.render_poll_chart, self.question, self.options, values, timeout=2))
+                file = discord.File(io.BytesIO(png), filename='poll_chart.png')
             except Exception as e:
-                print(f"Chart error: {e}")
+                print(f"Chart error: {e!r}")
 
         if file:
             await interaction.response.edit_message(content=res, embed=None, view=self, attachments=[file])
@@ -279,7 +421,7 @@ class PollView(discord.ui.View):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_question = "".join(x for x in self.question if x.isalnum())[:20]
         filename = f"polls/{timestamp}_{safe_question}.csv"
-        pd.DataFrame(results_data).to_csv(filename, index=False)
+        await offload.run_io(write_csv, results_data, filename)
         details += f"\nResults saved to `{filename}`"
         
         try:
@@ -296,26 +438,31 @@ class PollAnswerModal(discord.ui.Modal):
         self.add_item(self.answer)
 
     async def on_submit(self, interaction: discord.Interaction):
+        if self.view_ref.is_finished():
+             await interaction.response.send_message("This poll has ended.", ephemeral=True)
+             return
         if interaction.user.id in self.view_ref.answers:
              await interaction.response.send_message("You have updated your answer.", ephemeral=True)
         else:
              await interaction.response.send_message("Answer recorded.", ephemeral=True)
-        self.view_ref.answers[interaction.user.id] = self.answer.value
+        self.view_ref.answers.append(interaction.user.id, interaction.user.display_name, interaction.user.name, self.answer.value)
 
-        try:
-            if interaction.message:
+        if interaction.message:
+            def render():
                 embed = interaction.message.embeds[0]
                 embed.set_footer(text=f"Total Responses: {len(self.view_ref.answers)}")
-                await interaction.message.edit(embed=embed)
-        except Exception as e:
-            print(f"Error updating response count: {e}")
+                return {"embed": embed}
+            edits.edit(interaction.message, render, lambda e: print(f"Error updating response count: {e}"))
 
 class OpenPollView(discord.ui.View):
-    def __init__(self, question: str, author: discord.Member):
+    def __init__(self, poll_id: str, question: str, author_id: int):
         super().__init__(timeout=None)
+        self.poll_id = poll_id
         self.question = question
-        self.author = author
-        self.answers = {} # id -> text
+        self.author_id = author_id
+        self.answers = AnswerJournal(f"polls/journal/{poll_id}.log") # reopens existing answers after a restart
+        self.answer_btn.custom_id = f"openpoll:{poll_id}:answer"
+        self.end_btn.custom_id = f"openpoll:{poll_id}:end"
 
     @discord.ui.button(label="Answer Poll", style=discord.ButtonStyle.success, custom_id="open_poll_answer")
     async def answer_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -323,41 +470,28 @@ class OpenPollView(discord.ui.View):
 
     @discord.ui.button(label="End Poll", style=discord.ButtonStyle.danger, custom_id="open_poll_end")
     async def end_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.author.id:
+        if interaction.user.id != self.author_id:
             await interaction.response.send_message("Only the poll creator can end this poll.", ephemeral=True)
             return
+        polls.end(self.poll_id)
+        self.stop()
         
         for child in self.children:
             child.disabled = True
+        edits.discard(interaction.message.id)
         await interaction.response.edit_message(view=self)
 
-        results_data = []
-        txt_responses = []
-        
-        for uid, ans in self.answers.items():
-            u = interaction.guild.get_member(uid)
-            name = u.display_name if u else str(uid)
-            username = u.name if u else "Unknown"
-            results_data.append({"name": name, "username": username, "answer": ans, "id": uid})
-            txt_responses.append(ans)
-
         if not os.path.exists("polls"):
             os.makedirs("polls")
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_question = "".join(x for x in self.question if x.isalnum())[:20]
         filename = f"polls/{timestamp}_{safe_question}_open.csv"
-        pd.DataFrame(results_data).to_csv(filename, index=False)
+        txt_responses = await offload.run_io(self.answers.finalize, filename)
+        self.answers.close(delete=True)
         
         summary_text = "No API key provided or library missing."
-        if genai and "gemini_api_key" in config:
-            try:
-                genai.configure(api_key=config["gemini_api_key"])
-                model = genai.GenerativeModel('gemini-3-flash-preview')
-                prompt = f"Summarize the following responses to the question: '{self.question}'\n\nResponses:\n" + "\n".join([f"- {r}" for r in txt_responses])
-                response = await asyncio.to_thread(model.generate_content, prompt)
-                summary_text = response.text
-            except Exception as e:
-                summary_text = f"Error generating summary: {e}"
+        if summarizer:
+            summary_text = await summarizer.summarize(self.question, txt_responses)
 
         final_content = f"**Poll Ended: {self.question}**\n\n**Summary:**\n{summary_text}"
         if len(final_content) > 2000:
@@ -377,11 +511,13 @@ async def poll(interaction: discord.Interaction, question: str, options: str = N
         await interaction.response.send_message("You do not have permission to create a poll.", ephemeral=True)
         return
 
+    poll_id = str(interaction.id)
     if open_ended:
-        view = OpenPollView(question, interaction.user)
+        view = OpenPollView(poll_id, question, interaction.user.id)
         embed = discord.Embed(title=question, description="Click the button below to answer.", color=0x00ff00)
         embed.set_author(name=interaction.user.display_name, icon_url=interaction.user.display_avatar.url)
         await interaction.response.send_message(embed=embed, view=view)
+        polls.create(poll_id, "open", question, [], interaction.user.id, interaction.channel_id) # only once the message exists, so a failed send leaves no poll to recover
         return
 
     if options:
@@ -396,11 +532,12 @@ async def poll(interaction: discord.Interaction, question: str, options: str = N
         await interaction.response.send_message("You can only have up to 20 options.", ephemeral=True)
         return
 
-    view = PollView(question, opts, interaction.user)
+    view = PollView(poll_id, question, opts, interaction.user.id)
     embed = discord.Embed(title=question, description="Vote by clicking the buttons below.", color=0x00ff00)
     embed.set_author(name=interaction.user.display_name, icon_url=interaction.user.display_avatar.url)
     
     await interaction.response.send_message(embed=embed, view=view)
+    polls.create(poll_id, "choice", question, opts, interaction.user.id, interaction.channel_id) # queued before any vote can be
 
 class RegisterModal(discord.ui.Modal):
     def __init__(self, class_info):
@@ -421,24 +558,27 @@ class RegisterModal(discord.ui.Modal):
             await interaction.response.send_message("Invalid password provided.", ephemeral=True)
             return
         
-        guild = bot.guilds[0]
-        member = guild.get_member(interaction.user.id)
-        role = discord.utils.get(guild.roles, name=self.class_info["role"])
+        guild = class_guild(self.class_info) if pinned(self.class_info) else interaction.guild
+        member = guild.get_member(interaction.user.id) if guild else None
+        if member is None:
+             await interaction.response.send_message("You need to be a member of this class's server to register.", ephemeral=True)
+             return
+        role = guild_cache.role(guild, self.class_info["role"])
         
         if not role:
              await interaction.response.send_message(f"Role {self.class_info['role']} not found.", ephemeral=True)
              return
 
+        await interaction.response.defer(ephemeral=True) # retries can take longer than the 3 seconds Discord allows for a response
         try:
-            await member.add_roles(role)
-            await member.edit(nick=self.full_name.value)
-            await interaction.response.send_message(f"Successfully registered for {self.class_info['name']}!", ephemeral=True)
+            await member_updates.apply(member, role, self.full_name.value)
+            await interaction.followup.send(f"Successfully registered for {self.class_info['name']}!", ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"Registered, but could not update nickname/role: {e}", ephemeral=True)
+            await interaction.followup.send(f"Registered, but could not update nickname/role: {e}", ephemeral=True)
 
 class RegisterSelect(discord.ui.Select):
-    def __init__(self):
-        options = [discord.SelectOption(label=c["name"], value=str(i)) for i, c in enumerate(classes)]
+    def __init__(self, guild_id=None):
+        options = [discord.SelectOption(label=c["name"], value=str(i)) for i, c in enumerate(classes) if c.get("guild_id") in (None, guild_id)]
         super().__init__(placeholder="Select a class...", min_values=1, max_values=1, options=options)
     
     async def callback(self, interaction: discord.Interaction):
@@ -446,7 +586,39 @@ class RegisterSelect(discord.ui.Select):
 
 @bot.tree.command(name="register", description="Register for a class")
 async def register(interaction: discord.Interaction):
-    await interaction.response.send_message("Please select a class:", view=discord.ui.View().add_item(RegisterSelect()), ephemeral=True)
+    await interaction.response.send_message("Please select a class:", view=discord.ui.View().add_item(RegisterSelect(interaction.guild_id)), ephemeral=True)
+
+@bot.tree.command(name="import_roster", description="Register every student on a roster CSV for this class (Admin only)")
+@discord.app_commands.describe(roster="CSV with a username column (Discord usernames) and an optional name column (full names, used as nicknames)")
+async def import_roster(interaction: discord.Interaction, roster: discord.Attachment):
+    if not (hasattr(interaction.user, "roles") and discord.utils.get(interaction.user.roles, name="Admin")):
+        await interaction.response.send_message("Only admins can use this.", ephemeral=True)
+        return
+
+    channel = interaction.channel
+    matches = schedule_index.classes_for(channel.name, interaction.guild_id, channel.id)
+    role = guild_cache.role(interaction.guild, matches[0].info["role"]) if matches else None
+    if role is None:
+        await interaction.response.send_message("Use this in a class channel whose role exists." if matches else "This is not a class channel.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    data = await roster.read()
+    try:
+        rows = parse_roster(data)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        await interaction.followup.send(f"Could not read the roster: {e}", ephemeral=True)
+        return
+
+    # the journal is keyed by the file's contents, so uploading the same roster again resumes it
+    journal = RosterJournal(f"imports/{interaction.guild_id}_{role.id}_{hashlib.sha256(data).hexdigest()[:16]}.log")
+    job = RosterImport(member_updates, role, rows, journal, lambda username: guild_cache.member(interaction.guild, username))
+    status = await interaction.followup.send(job.progress(), ephemeral=True, wait=True)
+    try:
+        await job.run(lambda: edits.edit(status, lambda: {"content": job.progress()}))
+    finally:
+        journal.close()
+    await interaction.followup.send(job.summary(), ephemeral=True)
 
 class AskView(discord.ui.View):
     def __init__(self, author: discord.Member):
@@ -465,7 +637,7 @@ async def ask(interaction: discord.Interaction, question: str):
     embed = discord.Embed(title="Anonymous Question", description=question, color=0xFFA500)
     
     notify_name = config.get("notify_user")
-    prof = discord.utils.get(interaction.guild.members, name=notify_name) if notify_name else None
+    prof = guild_cache.member(interaction.guild, notify_name) if notify_name else None
     content = f"{prof.mention} New question!" if prof else "New question!"
 
     await interaction.channel.send(content=content, embed=embed, view=AskView(interaction.user))
@@ -477,42 +649,32 @@ class QueueGroup(discord.app_commands.Group):
 
     @discord.app_commands.command(name="join", description="Join the queue")
     async def join(self, interaction: discord.Interaction):
-        if interaction.channel_id not in queues:
-            queues[interaction.channel_id] = []
-        
-        q = queues[interaction.channel_id]
-        if any(u.id == interaction.user.id for u in q):
-            await interaction.response.send_message("You are already in the queue.", ephemeral=True)
+        position = queues.join(interaction.channel_id, interaction.user.id, interaction.user.display_name)
+        if position is None:
+            await interaction.response.send_message(f"You are already in the queue. Position: {queues.get(interaction.channel_id).position(interaction.user.id)}", ephemeral=True)
             return
         
-        q.append(interaction.user)
-        await interaction.response.send_message(f"Joined the queue. Position: {len(q)}", ephemeral=True)
+        await interaction.response.send_message(f"Joined the queue. Position: {position}", ephemeral=True)
         await update_queue_display(interaction.channel_id)
 
     @discord.app_commands.command(name="leave", description="Leave the queue")
     async def leave(self, interaction: discord.Interaction):
-        q = queues.get(interaction.channel_id, [])
-        
-        original_len = len(q)
-        queues[interaction.channel_id] = [u for u in q if u.id != interaction.user.id]
-        
-        if len(queues[interaction.channel_id]) < original_len:
+        if queues.leave(interaction.channel_id, interaction.user.id):
             await interaction.response.send_message("You have left the queue.", ephemeral=True)
             await update_queue_display(interaction.channel_id)
         else:
             await interaction.response.send_message("You are not in the queue.", ephemeral=True)
 
     @discord.app_commands.command(name="list", description="View the current queue")
-    async def list_queue(self, interaction: discord.Interaction):
-        q = queues.get(interaction.channel_id, [])
-        
-        msg = "**Current Queue:**\n"
-        if not q:
-            msg += "The queue is empty."
-        else:
-            for i, member in enumerate(q):
-                msg += f"{i+1}. {member.display_name}\n"
+    @discord.app_commands.describe(page="Page of the queue to show (default: 1)")
+    async def list_queue(self, interaction: discord.Interaction, page: int = 1):
+        q = queues.get(interaction.channel_id)
+        page = min(max(page, 1), q.pages())
+        msg = q.render(page)
         
+        if page > 1: # only the first page is kept live
+            await interaction.response.send_message(msg, ephemeral=True)
+            return
         if interaction.channel_id in queue_messages:
             try: await queue_messages[interaction.channel_id].delete()
             except: pass
@@ -525,13 +687,13 @@ class QueueGroup(discord.app_commands.Group):
             await interaction.response.send_message("Only admins can use this.", ephemeral=True)
             return
 
-        q = queues.get(interaction.channel_id, [])
-        if not q:
+        entry = queues.next(interaction.channel_id)
+        if entry is None:
             await interaction.response.send_message("The queue is empty.", ephemeral=True)
             return
         
-        member = q.pop(0)
-        await interaction.response.send_message(f"Next up: {member.mention}")
+        user_id, name = entry
+        await interaction.response.send_message(f"Next up: <@{user_id}>")
         await update_queue_display(interaction.channel_id)
 
     @discord.app_commands.command(name="clear", description="Clear the queue (Admin only)")
@@ -540,7 +702,7 @@ class QueueGroup(discord.app_commands.Group):
             await interaction.response.send_message("Only admins can use this.", ephemeral=True)
             return
         
-        queues[interaction.channel_id] = []
+        queues.clear(interaction.channel_id)
         await interaction.response.send_message("Queue cleared.")
         await update_queue_display(interaction.channel_id)
 
@@ -553,31 +715,114 @@ async def coldcall(interaction: discord.Interaction):
         return
     
     channel = interaction.channel
-    with db_connection() as con:
-        df = pd.read_sql("select distinct member from checkins where course=? and date(time)=?", con, params=(channel.name, datetime.now().strftime("%Y-%m-%d")))
+    student = coldcaller.pick(interaction.guild_id, channel.name, datetime.now().strftime("%Y-%m-%d"))
     
-    if df.empty:
+    if student is None:
         await interaction.response.send_message("No students are checked in yet.", ephemeral=True)
     else:
-        student = df.sample().iloc[0]['member']
         await interaction.response.send_message(f"🎲 Random Pick: **{student}**")
 
+def ms(seconds):
+    return f"{seconds * 1000:.0f}ms"
+
+@bot.tree.command(name="stats", description="Show bot performance statistics (Admin only)")
+async def stats(interaction: discord.Interaction):
+    if not (hasattr(interaction.user, "roles") and discord.utils.get(interaction.user.roles, name="Admin")):
+        await interaction.response.send_message("Only admins can use this.", ephemeral=True)
+        return
+
+    uptime = int(time.time() - metrics.started)
+    lines = [f"Uptime: {uptime // 3600}h{uptime % 3600 // 60:02d}m | loop lag max {ms(loop_lag.max_lag)}, {loop_lag.stalls} stalls"]
+    lines.append(f"{'command':<20}{'calls':>7}{'errors':>7}{'p50':>8}{'p99':>8}")
+    for labels, h in sorted(metrics.series("classy_command_seconds"), key=lambda s: -s[1].count):
+        errors = metrics.total("classy_commands_total", command=labels["command"], status="error")
+        lines.append(f"{labels['command']:<20}{h.count:>7}{errors:>7}{ms(h.quantile(0.5)):>8}{ms(h.quantile(0.99)):>8}")
+    for name, label in (("classy_db_read_seconds", "DB reads"), ("classy_db_write_seconds", "DB writes"), ("classy_http_seconds", "Discord API")):
+        series = [h for _, h in metrics.series(name)]
+        if series:
+            worst = max(series, key=lambda h: h.quantile(0.99))
+            lines.append(f"{label}: {sum(h.count for h in series)} calls, p99 {ms(worst.quantile(0.99))}")
+    for labels, h in metrics.series("classy_task_seconds"):
+        errors = metrics.total("classy_task_errors_total", task=labels["task"])
+        lines.append(f"Task {labels['task']}: {h.count} runs, {errors} errors, p99 {ms(h.quantile(0.99))}")
+    lines.append(f"DB commits: {metrics.total('classy_db_commits_total')}, write-behind errors: {metrics.total('classy_db_write_behind_errors_total')}")
+    lines.append(f"Discord API: {metrics.total('classy_http_errors_total')} errors, {metrics.total('classy_http_rate_limited_total')} rate limited (429)")
+    lines.append(f"Message edits: {edits.requested} requested, {edits.sent} sent, {edits.saved} saved by coalescing, {edits.failed} failed")
+    msg = "```\n" + "\n".join(lines) + "\n```"
+    if len(msg) > 2000:
+        msg = msg[:1990] + "\n...```"
+    await interaction.response.send_message(msg, ephemeral=True)
+
+@bot.event
+async def setup_hook(): # runs before the gateway connects, so recovered polls are routable from the first click
+    t = time.perf_counter()
+    recovered = polls.load_open()
+    for p in recovered:
+        if p["kind"] == "open":
+            bot.add_view(OpenPollView(p["poll_id"], p["question"], p["author_id"]))
+        else:
+            bot.add_view(PollView(p["poll_id"], p["question"], p["options"], p["author_id"], p["votes"]))
+    print(f"Recovered {len(recovered)} open polls in {(time.perf_counter() - t) * 1000:.0f}ms")
+
+def command_tree_hash(): # changes whenever a command, option or description does
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_commands(guilds): # only talks to Discord for guilds whose last synced tree differs from this one
+    tree_hash = command_tree_hash()
+    synced = dict(await db.read(lambda con: con.execute("select scope, hash from command_sync").fetchall()))
+    if synced.get(0) != tree_hash:
+        # cleanup: remove any global command registrations (we use per-guild sync,
+        # and previous versions of on_ready also pushed globally, causing duplicates)
+        try:
+            await bot.http.bulk_upsert_global_commands(bot.application_id, [])
+            db.write_behind("insert or replace into command_sync (scope, hash) values (0, ?)", (tree_hash,))
+        except Exception as e:
+            print(f"Warning: could not clear global commands: {e}")
+    for guild in guilds:
+        bot.tree.copy_global_to(guild=guild)
+        if synced.get(guild.id) == tree_hash:
+            continue
+        try:
+            await bot.tree.sync(guild=guild)
+            db.write_behind("insert or replace into command_sync (scope, hash) values (?, ?)", (guild.id, tree_hash))
+        except Exception as e:
+            print(f"Warning: could not sync commands to {guild.name}: {e}")
+
+async def assign_legacy_checkins(): # check-ins and cold calls from before they were keyed by guild go to their class's guild
+    assignments = []
+    for compiled in schedule_index.compiled():
+        # before v10 the bot only served bot.guilds[0], so an unpinned class's rows go to the first guild that has it
+        guilds = class_guilds(compiled.info)
+        guild_id = compiled.guild_id or (guilds[0].id if guilds else None)
+        if guild_id:
+            assignments.append((guild_id, compiled.channel, compiled.start_day.isoformat(), compiled.end_day.isoformat()))
+    if assignments and await db.write(lambda con: assign_guilds(con, assignments)):
+        await checkins.reload()
+        await coldcaller.reload()
+
 @bot.event
 async def on_ready():
     print('We have logged in as {0.user}'.format(bot))
-    # one-time cleanup: remove any global command registrations (we use per-guild sync,
-    # and previous versions of on_ready also pushed globally, causing duplicates)
-    try:
-        await bot.http.bulk_upsert_global_commands(bot.application_id, [])
-    except Exception as e:
-        print(f"Warning: could not clear global commands: {e}")
-    for guild in bot.guilds:
-        bot.tree.copy_global_to(guild=guild)
-        await bot.tree.sync(guild=guild)
+    for guild in bot.guilds: # rebuilt on every (re)connect, in case events were missed while away
+        guild_cache.index(guild)
+    await assign_legacy_checkins()
+    await sync_commands(bot.guilds)
     if not hasattr(bot, "schedule_started"):
         bot.loop.create_task(check_schedule())
+        loop_lag.start(bot.loop)
+        if charts.available:
+            offload.warm(charts.preload) # so the first poll chart doesn't pay for importing matplotlib
+        if config.get("metrics_file"):
+            bot.loop.create_task(write_metrics(config["metrics_file"], config.get("metrics_interval", 15)))
+        if config.get("archive_after_days", 30) is not None: # after assign_legacy_checkins, so archived rows carry their guild
+            bot.loop.create_task(archive_daily(config.get("archive_after_days", 30)))
         bot.schedule_started = True
 
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    command_finished(interaction, "ok")
+
 @bot.event
 async def on_message(message: discord.Message):
 
@@ -588,29 +833,110 @@ async def on_message(message: discord.Message):
         return
         
 
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    guild_cache.index(guild)
+    await sync_commands([guild])
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    guild_cache.forget(guild)
+    db.write_behind("delete from command_sync where scope=?", (guild.id,)) # so a re-invite syncs the commands again
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    guild_cache.member_changed(after)
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User): # usernames are per user, not per guild
+    if before.name != after.name:
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member: guild_cache.member_changed(member)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    guild_cache.member_removed(member)
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    guild_cache.role_changed(role)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    guild_cache.role_changed(after)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    guild_cache.role_removed(role)
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    guild_cache.channel_changed(channel)
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    guild_cache.channel_changed(after)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    guild_cache.channel_removed(channel)
+
 @bot.event
 async def on_member_join(member: discord.Member):
+    guild_cache.member_changed(member)
 
     await member.send(f"Welcome to the server.  If you would like to register for a course, please use the `/register` command in the server.")
 
+async def period_opened(cl, period): # remind the class to check in when a period starts, in every guild it runs in
+    async def remind(guild):
+        channel = class_channel(cl, guild)
+        role = guild_cache.role(guild, cl["role"])
+        if channel is None or role is None: # deleted or renamed, or not in the cache yet
+            print(f"{cl['name']}: no {'channel ' + cl['channel'] if channel is None else 'role ' + cl['role']} in {guild.name}, skipping the check-in reminder")
+            return
+        await channel.send(f"{role.mention} time to check in.")
+    guilds = class_guilds(cl) # none when the class belongs to another shard's (or an unreachable) guild
+    results = await asyncio.gather(*(remind(guild) for guild in guilds), return_exceptions=True)
+    for guild, result in zip(guilds, results):
+        if isinstance(result, Exception):
+            print(f"{cl['name']}: could not send the check-in reminder in {guild.name}: {result!r}")
+
+async def period_closed(cl, period):
+    if not class_guilds(cl):
+        return
+    print(f"{cl['name']}: {period['day']} {period['start']}-{period['end']} period ended")
+
 async def check_schedule(): # we need to check the schedule to determine if we should remind users to login
+    await EventScheduler(schedule_index, metrics.timed_task(period_opened, "period_opened"),
+                         metrics.timed_task(period_closed, "period_closed")).run()
+
+async def archive_daily(after_days): # move check-ins of classes that have ended out of classes.db, once a day while no class meets
+    # archiving takes as long as it takes: a timeout would only leave it running unobserved
+    run = metrics.timed_task(lambda: offload.run_io(archive.archive_ended, "classes.db", classes, after_days, timeout=NO_TIMEOUT), "archive")
     while True:
-        await asyncio.sleep(5) 
-        t = datetime.now(tz=pytz.utc)
+        while schedule_index.busy(): # check-ins are when writes matter most; wait for a gap between periods
+            await asyncio.sleep(300)
+        try:
+            moved = await run()
+        except Exception as e: # e.g. classes.db locked by another shard's run; the next run catches up
+            print(f"Could not archive check-ins: {e}")
+            moved = {}
+        for term, n in moved.items():
+            print(f"Archived {n} check-ins from {term} to {archive.archive_path(term)}")
+        await checkins.reload() # even after an error: each committed batch already took its rows out of the rollup tables
+        await asyncio.sleep(24 * 3600)
+
+async def write_metrics(path, interval): # for a node exporter's textfile collector
+    write = metrics.timed_task(lambda: offload.run_io(metrics.write, path), "write_metrics")
+    while True:
+        try:
+            await write()
+        except Exception as e:
+            print(f"Could not write metrics to {path}: {e}")
+        await asyncio.sleep(interval)
 
-        for cl in classes:
-            
-            lt = t.astimezone(tz=pytz.timezone(cl["tz"]))
-            current_day = lt.date()
-            period = get_period(cl["channel"])
-            if period == None: continue
-            if ("last_sent" not in period) or (period["last_sent"].date() != current_day):
-                period["last_sent"] = lt
-                #now send the message as a reminder to login
-                channel = discord.utils.get(bot.guilds[0].channels,name=cl["channel"])
-                period["checked_in"] = [] #cheap way to get rid of the checked_in list
-                role = discord.utils.get(bot.guilds[0].roles,name=cl["role"])
-                await channel.send(f"{role.mention} time to check in.")
-                            
-
-bot.run(config["key"])
+if __name__ == "__main__": # bench/loadtest.py imports this module to drive the handlers offline
+    bot.run(config["key"])
+    db.close() # drain any queued check-ins before exiting
+    offload.shutdown()
@@ -0,0 +1,157 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process counters, gauges and fixed-bucket histograms, rendered in the Prometheus text format
+# (for a node exporter's textfile collector) and summarized by /stats. An observation is a bisect
+# and two additions under a lock, so it is cheap enough to record from the event loop and from the
+# database threads alike. Series are keyed by metric name plus labels.
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30) # seconds
+
+HELP = {
+    "classy_command_seconds": "App command handler time",
+    "classy_commands_total": "App commands handled, by status",
+    "classy_db_read_seconds": "Time to run a read query, including waiting for a pooled connection",
+    "classy_db_write_seconds": "Time from queueing a write to its commit",
+    "classy_db_commit_seconds": "Time to run and commit one group-commit batch",
+    "classy_db_writes_total": "Write jobs committed or failed",
+    "classy_db_commits_total": "Group-commit transactions",
+    "classy_db_write_behind_errors_total": "Write-behind jobs that failed",
+    "classy_http_seconds": "Discord HTTP API call time, including rate limit waits",
+    "classy_http_errors_total": "Discord HTTP API calls that raised, by status",
+    "classy_http_rate_limited_total": "429 responses from the Discord API",
+    "classy_task_seconds": "Background task run time",
+    "classy_task_errors_total": "Background task runs that raised",
+}
+
+def escape(value): # label values per the text exposition format: backslash, double quote and newline
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q): # estimated like Prometheus' histogram_quantile: linear within the bucket
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {} # (name, labels) -> Histogram
+        self.counters = {} # (name, labels) -> Counter
+        self.gauges = {} # name -> fn returning the current value, read at render time
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _series(self, table, cls, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        series = table.get(key)
+        if series is None:
+            with self._lock:
+                series = table.setdefault(key, cls())
+        return series
+
+    def observe(self, name, seconds, **labels):
+        self._series(self.histograms, Histogram, name, labels).observe(seconds)
+
+    def inc(self, name, n=1, **labels):
+        self._series(self.counters, Counter, name, labels).inc(n)
+
+    def gauge(self, name, fn, help=None):
+        self.gauges[name] = fn
+        if help: HELP.setdefault(name, help)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t, **labels)
+
+    def timed_task(self, fn, task): # wraps a coroutine function so each run is timed as a background task
+        async def run(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                self.inc("classy_task_errors_total", task=task)
+                raise
+            finally:
+                self.observe("classy_task_seconds", time.perf_counter() - t, task=task)
+        return run
+
+    def series(self, name): #[(labels dict, Histogram or Counter)] for one metric name
+        return [(dict(labels), s) for table in (self.histograms, self.counters)
+                for (n, labels), s in list(table.items()) if n == name]
+
+    def total(self, name, **labels): # sum of a counter over the series matching the given labels
+        return sum(c.value for l, c in self.series(name) if all(l.get(k) == v for k, v in labels.items()))
+
+    def render(self): #Prometheus text exposition format
+        lines = []
+        counters = sorted(list(self.counters.items()), key=lambda kv: kv[0]) # snapshots: other threads may add series
+        histograms = sorted(list(self.histograms.items()), key=lambda kv: kv[0])
+        def header(name, kind):
+            if name in HELP: lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+        def fmt(labels, extra=()):
+            pairs = [f'{k}="{escape(v)}"' for k, v in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        for name in sorted({n for (n, _), _ in counters}):
+            header(name, "counter")
+            for (n, labels), c in counters:
+                if n == name: lines.append(f"{name}{fmt(labels)} {c.value}")
+        for name in sorted({n for (n, _), _ in histograms}):
+            header(name, "histogram")
+            for (n, labels), h in histograms:
+                if n != name: continue
+                cumulative = 0
+                for bound, count in zip((*h.bounds, "+Inf"), h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{fmt(labels)} {h.sum}")
+                lines.append(f"{name}_count{fmt(labels)} {h.count}")
+        for name, fn in sorted(self.gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name} {fn()}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path): # atomically, so the exporter never reads a half-written file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
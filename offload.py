@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Shared pools for work that must not run on the discord.py event loop: a thread pool for blocking
+# I/O (SQLite, CSV files, HTTP clients) and a process pool for CPU-bound work (chart rendering).
+# main.py opens the database and starts these pools when it is imported, so spawn/forkserver workers
+# (which re-import the main module) can't be used; the process pool is forked up front, before any
+# other threads exist.
+
+NO_TIMEOUT = float("inf") # timeout= for jobs that may take as long as they need, e.g. archiving
+
+class Offload:
+    def __init__(self, io_workers=8, cpu_workers=2, timeout=30):
+        self.timeout = timeout # seconds, for jobs that don't pass their own
+        self.cpu_workers = cpu_workers
+        self.io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="offload-io")
+        if "fork" in multiprocessing.get_all_start_methods():
+            self.cpu = ProcessPoolExecutor(max_workers=cpu_workers, mp_context=multiprocessing.get_context("fork"))
+        else:
+            self.cpu = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="offload-cpu")
+        self.timeouts = 0
+
+    def start(self): # a fork-based process pool creates all of its workers on the first submit
+        if isinstance(self.cpu, ProcessPoolExecutor):
+            self.cpu.submit(int).result()
+
+    def warm(self, fn): # run fn once per CPU worker (best effort), e.g. to import a library before the first job needs it
+        for _ in range(self.cpu_workers):
+            self.cpu.submit(fn)
+
+    async def _run(self, executor, fn, args, kwargs, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        future = executor.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), None if timeout == NO_TIMEOUT else timeout)
+        except asyncio.TimeoutError:
+            future.cancel() # only helps if it hasn't started; a running job finishes in the background
+            self.timeouts += 1
+            raise
+
+    async def run_io(self, fn, *args, timeout=None, **kwargs):
+        return await self._run(self.io, fn, args, kwargs, timeout)
+
+    async def run_cpu(self, fn, *args, timeout=None, **kwargs): # fn and its arguments must be picklable
+        return await self._run(self.cpu, fn, args, kwargs, timeout)
+
+    def shutdown(self):
+        self.io.shutdown(wait=False, cancel_futures=True)
+        self.cpu.shutdown(wait=False, cancel_futures=True)
+
+class LoopLagMonitor:
+    # A heartbeat coroutine measures how late the loop wakes it up. A watchdog thread notices when
+    # the heartbeat stops during a stall and prints what the loop thread is running at that moment,
+    # which is the callback holding the loop.
+    def __init__(self, threshold=0.25, interval=0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_beat = time.monotonic()
+        self._loop_thread = None
+        self._reported = False
+        self._running = False
+
+    def start(self, loop):
+        self._loop_thread = threading.get_ident()
+        self._running = True
+        loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-lag-watchdog", daemon=True).start()
+
+    async def _heartbeat(self):
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = now - expected
+                self.last_beat = now
+                self._reported = False
+                self.max_lag = max(self.max_lag, lag)
+                if lag > self.threshold:
+                    self.stalls += 1
+                    print(f"Event loop was blocked for {lag * 1000:.0f}ms")
+        finally:
+            self._running = False
+
+    def _watchdog(self):
+        while self._running:
+            time.sleep(self.interval)
+            if self._reported or time.monotonic() - self.last_beat < self.interval + self.threshold:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                stack = "".join(traceback.format_stack(frame, limit=8))
+                print(f"Event loop blocked for more than {self.threshold * 1000:.0f}ms in:\n{stack}")
@@ -0,0 +1,94 @@
+import csv
+import json
+import os
+from datetime import datetime
+
+# Journals poll definitions and votes to classes.db through the write-behind queue, so interactions
+# never wait on disk, and reads back every poll that hasn't ended for recovery. Open-ended answers
+# can be long, so they go to a per-poll AnswerJournal file instead.
+
+class PollStore:
+    def __init__(self, db):
+        self.db = db
+
+    def create(self, poll_id, kind, question, options, author_id, channel_id):
+        self.db.write_behind("insert into polls (poll_id, kind, question, options, author_id, channel_id, created) values (?,?,?,?,?,?,?)",
+                             (poll_id, kind, question, json.dumps(options), author_id, channel_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def vote(self, poll_id, user_id, choice):
+        self.db.write_behind("insert or ignore into poll_votes (poll_id, user_id, choice) values (?,?,?)", (poll_id, user_id, choice))
+
+    def end(self, poll_id):
+        self.db.write_behind("update polls set ended=1 where poll_id=?", (poll_id,))
+
+    def load_open(self): #returns a list of poll dicts, each with its votes keyed by user id
+        def read(con):
+            polls = {}
+            for poll_id, kind, question, options, author_id, channel_id in con.execute(
+                    "select poll_id, kind, question, options, author_id, channel_id from polls where ended=0"):
+                polls[poll_id] = {"poll_id": poll_id, "kind": kind, "question": question, "options": json.loads(options),
+                                  "author_id": author_id, "channel_id": channel_id, "votes": {}}
+            for poll_id, user_id, choice in con.execute(
+                    "select v.poll_id, v.user_id, v.choice from poll_votes v join polls p using (poll_id) where p.ended=0"):
+                polls[poll_id]["votes"][user_id] = choice
+            return list(polls.values())
+        return self.db.read_sync(read)
+
+class AnswerJournal:
+    # Append-only file of answers for one open-ended poll. Only the offset of each user's latest
+    # record is kept in memory; a resubmitted answer is appended and simply moves the offset.
+    def __init__(self, path):
+        self.path = path
+        self.index = {} # user id -> offset of their latest record, in order of first answer
+        self.size = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            self._rebuild()
+        self.f = None # opened on the first answer, so idle polls don't hold a file handle
+
+    def _rebuild(self): # after a restart: rescan the file, dropping a torn final record
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"): break
+                self.index[json.loads(line)["id"]] = self.size
+                self.size += len(line)
+        if os.path.getsize(self.path) != self.size:
+            os.truncate(self.path, self.size)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, user_id):
+        return user_id in self.index
+
+    def append(self, user_id, name, username, answer):
+        line = (json.dumps({"id": user_id, "name": name, "username": username, "answer": answer}) + "\n").encode()
+        if self.f is None:
+            self.f = open(self.path, "ab")
+        self.f.write(line)
+        self.f.flush()
+        self.index[user_id] = self.size
+        self.size += len(line)
+
+    def records(self): # each user's latest answer, in the order they first answered
+        if not self.index: return
+        with open(self.path, "rb") as f:
+            for offset in list(self.index.values()):
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def finalize(self, filename): #writes the results CSV (name, username, answer, id) and returns the answer texts
+        answers = []
+        with open(filename, "w", newline="") as out:
+            writer = csv.writer(out, lineterminator=os.linesep)
+            writer.writerow(["name", "username", "answer", "id"])
+            for r in self.records():
+                writer.writerow([r["name"], r["username"], r["answer"], r["id"]])
+                answers.append(r["answer"])
+        return answers
+
+    def close(self, delete=False):
+        if self.f is not None:
+            self.f.close()
+        if delete and os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,48 @@
+import charts
+
+# Attendance trends for /attendance_report, computed with NumPy from the rollup tables: check-ins
+# per session (course_sessions) and sessions attended per student (student_attendance). Both are
+# bounded by the number of sessions and students, so no raw check-in rows are read. build_report
+# runs in Offload's process pool; numpy and matplotlib are only imported there.
+
+TREND_WINDOW = 5 # sessions in the rolling average
+
+def read_report_data(con, guild_id, course): #(session dates, check-ins per session, sessions attended per student)
+    rows = con.execute("select session_date, checkins from course_sessions where guild_id=? and course=? order by session_date", (guild_id, course)).fetchall()
+    attended = [row[0] for row in con.execute("select sessions from student_attendance where guild_id=? and course=?", (guild_id, course))]
+    return [r[0] for r in rows], [r[1] for r in rows], attended
+
+def attendance_stats(counts, attended):
+    import numpy as np
+    counts = np.asarray(counts, dtype=float)
+    attended = np.asarray(attended, dtype=int)
+    n_sessions = len(counts)
+    window = min(TREND_WINDOW, n_sessions)
+    rates = attended / n_sessions * 100 if len(attended) else np.zeros(1)
+    return {
+        "sessions": n_sessions,
+        "students": len(attended),
+        "mean": counts.mean(),
+        "recent": counts[-window:].mean(),
+        "slope": np.polyfit(np.arange(n_sessions), counts, 1)[0] if n_sessions > 1 else 0.0, # check-ins gained per session
+        "trend": np.convolve(counts, np.ones(window) / window, mode="valid"),
+        "best": int(counts.argmax()),
+        "worst": int(counts.argmin()),
+        "median_rate": np.median(rates),
+        "low_rate": np.percentile(rates, 25),
+        "below_half": int((rates < 50).sum()),
+        "distribution": np.bincount(attended, minlength=n_sessions + 1),
+    }
+
+def build_report(course, dates, counts, attended, chart=True): #returns (summary text, PNG bytes or None)
+    s = attendance_stats(counts, attended)
+    summary = (
+        f"**Attendance report for {course}**\n"
+        f"Sessions: {s['sessions']} | Students: {s['students']} | Average check-ins: {s['mean']:.1f} "
+        f"(last {min(TREND_WINDOW, s['sessions'])}: {s['recent']:.1f}, trend {s['slope']:+.2f} per session)\n"
+        f"Attendance rate: median {s['median_rate']:.0f}%, 25th percentile {s['low_rate']:.0f}%, "
+        f"{s['below_half']} students below 50%\n"
+        f"Best session: {dates[s['best']]} ({int(counts[s['best']])}) | Lowest: {dates[s['worst']]} ({int(counts[s['worst']])})"
+    )
+    png = charts.render_attendance_chart(course, dates, counts, s["trend"], s["distribution"]) if chart else None
+    return summary, png
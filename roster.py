@@ -0,0 +1,143 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+
+# Class roles and nicknames for many students at once. Every member update, from a roster import or
+# from /register, goes through one MemberUpdater: at most a few requests in flight per route and
+# guild, and retries with backoff for 429s, server errors and timeouts. discord.py already waits out
+# the rate limit buckets it knows about; this keeps hundreds of concurrent updates from piling onto
+# one bucket and retries the requests it gives up on. Imports journal each row's outcome, so running
+# the same roster file again only redoes the rows that didn't succeed.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class MemberUpdater:
+    def __init__(self, per_route=2, retries=4, backoff=1.0):
+        self.per_route = per_route
+        self.retries = retries
+        self.backoff = backoff # seconds before the first retry, doubled for each one after it
+        self.routes = {} # (route, guild id) -> Semaphore
+        self.retried = 0
+
+    async def _call(self, route, guild_id, request):
+        semaphore = self.routes.setdefault((route, guild_id), asyncio.Semaphore(self.per_route))
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                try:
+                    return await request()
+                except Exception as e:
+                    transient = getattr(e, "status", None) in RETRY_STATUSES or isinstance(e, (asyncio.TimeoutError, OSError))
+                    if not transient or attempt == self.retries:
+                        raise
+                    delay = getattr(e, "retry_after", None) or self.backoff * 2 ** attempt
+            self.retried += 1
+            await asyncio.sleep(delay * (1 + random.random() / 2)) # jitter, so retries don't line up again
+
+    async def apply(self, member, role=None, nick=None): #returns what changed: a list of "role" and/or "nick"
+        changes = []
+        if role is not None and role not in member.roles:
+            await self._call("add_role", member.guild.id, lambda: member.add_roles(role))
+            changes.append("role")
+        if nick and member.nick != nick:
+            await self._call("edit_member", member.guild.id, lambda: member.edit(nick=nick))
+            changes.append("nick")
+        return changes
+
+def parse_roster(data): #[(username, full name)] from CSV bytes with a username column and an optional name column
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    columns = {(c or "").strip().lower(): c for c in reader.fieldnames or []}
+    if "username" not in columns:
+        raise ValueError("the roster needs a 'username' column")
+    rows = {} # username -> name; a repeated username keeps its last name
+    for row in reader:
+        username = (row[columns["username"]] or "").strip().lstrip("@").lower()
+        if username:
+            rows[username] = (row[columns["name"]] or "").strip() if "name" in columns else ""
+    return list(rows.items())
+
+class RosterJournal:
+    # Append-only outcome of each row of one roster file; the latest record per username wins.
+    def __init__(self, path):
+        self.path = path
+        self.status = {} # username -> "done", "unmatched" or "failed"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"): break # torn final record from a crash
+                    record = json.loads(line)
+                    self.status[record["username"]] = record["status"]
+                    size += len(line)
+            os.truncate(path, size)
+        self.f = open(path, "a")
+
+    def record(self, username, status, detail=""):
+        self.f.write(json.dumps({"username": username, "status": status, "detail": detail}) + "\n")
+        self.f.flush()
+        self.status[username] = status
+
+    def close(self):
+        self.f.close()
+
+class RosterImport:
+    def __init__(self, updater, role, rows, journal, find_member, concurrency=4):
+        self.updater = updater
+        self.role = role
+        self.rows = rows
+        self.journal = journal
+        self.find_member = find_member # username -> member or None
+        self.concurrency = concurrency
+        self.updated = self.unchanged = self.skipped = 0
+        self.unmatched = []
+        self.failed = [] # (username, error)
+
+    @property
+    def processed(self):
+        return self.updated + self.unchanged + self.skipped + len(self.unmatched) + len(self.failed)
+
+    async def run(self, on_progress=None): # on_progress() is called after every row
+        rows = iter(self.rows)
+        async def worker():
+            for username, name in rows: # workers share the iterator, so each row is taken once
+                await self._import(username, name)
+                if on_progress: on_progress()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def _import(self, username, name):
+        if self.journal.status.get(username) == "done": # from an earlier, interrupted run of this file
+            self.skipped += 1
+            return
+        member = self.find_member(username)
+        if member is None:
+            self.unmatched.append(username)
+            self.journal.record(username, "unmatched")
+            return
+        try:
+            changes = await self.updater.apply(member, self.role, name[:32]) # nicknames are at most 32 characters
+        except Exception as e:
+            self.failed.append((username, str(e)))
+            self.journal.record(username, "failed", str(e))
+            return
+        if changes: self.updated += 1
+        else: self.unchanged += 1
+        self.journal.record(username, "done", ",".join(changes))
+
+    def progress(self):
+        return (f"Importing roster for {self.role.name}: {self.processed}/{len(self.rows)} "
+                f"({self.updated} updated, {self.skipped} already done, {len(self.unmatched)} not found, {len(self.failed)} failed)")
+
+    def summary(self):
+        msg = (f"**Roster import for {self.role.name}**\n"
+               f"Updated: {self.updated} | Already up to date: {self.unchanged + self.skipped} | "
+               f"Not found: {len(self.unmatched)} | Failed: {len(self.failed)}")
+        if self.unmatched:
+            msg += "\nNot in the server: " + ", ".join(self.unmatched[:30]) + (" ..." if len(self.unmatched) > 30 else "")
+        for username, error in self.failed[:10]:
+            msg += f"\n{username}: {error}"
+        if self.failed or self.unmatched:
+            msg += "\nRun the import again with the same file to retry the rest."
+        return msg[:2000]
@@ -0,0 +1,154 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from dateutil import parser
+import pytz
+
+# Class schedules compiled once from config["classes"] so lookups don't re-parse dates on every call
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+class CompiledClass:
+    def __init__(self, cl):
+        self.info = cl
+        self.channel = cl["channel"]
+        self.guild_id = cl.get("guild_id") # optional; without it the class matches its channel name in any guild
+        self.channel_id = cl.get("channel_id")
+        self.tz = pytz.timezone(cl["tz"])
+        self.start_day = parser.parse(cl["start_date"]).date()
+        self.end_day = parser.parse(cl["end_date"]).date()
+        self.exceptions = frozenset(parser.parse(d).date() for d in cl["exceptions"])
+
+        # weekday (0=monday) -> intervals sorted by start time, with a running max of end times
+        # so overlapping periods still resolve to the earliest configured match
+        self.days = {}
+        for order, period in enumerate(cl["periods"]):
+            start_time = datetime.strptime(period["start"], "%I:%M %p").time()
+            end_time = datetime.strptime(period["end"], "%I:%M %p").time()
+            if period["day"].lower() not in DAYS: continue
+            weekday = DAYS.index(period["day"].lower())
+            self.days.setdefault(weekday, []).append((start_time, end_time, order, period))
+        for weekday, intervals in self.days.items():
+            intervals.sort(key=lambda iv: (iv[0], iv[2]))
+            starts = [iv[0] for iv in intervals]
+            max_end = []
+            for iv in intervals:
+                max_end.append(max(max_end[-1], iv[1]) if max_end else iv[1])
+            self.days[weekday] = (starts, max_end, intervals)
+
+    def active_on(self, day):
+        return self.start_day <= day <= self.end_day and day not in self.exceptions
+
+    def period_at(self, lt): #lt must already be in this class's timezone
+        if not self.active_on(lt.date()):
+            return None
+        day = self.days.get(lt.weekday())
+        if day is None:
+            return None
+        starts, max_end, intervals = day
+        now = lt.time()
+        i = bisect.bisect_right(starts, now) - 1
+        best = None
+        while i >= 0 and max_end[i] > now:
+            start_time, end_time, order, period = intervals[i]
+            if now < end_time and (best is None or order < best[0]):
+                best = (order, period)
+            i -= 1
+        return best[1] if best else None
+
+    def next_events(self, after): #the earliest period boundaries strictly after `after`: (utc time, [(kind, period), ...]) or None
+        day = max(after.astimezone(self.tz).date(), self.start_day)
+        while day <= self.end_day:
+            if day.weekday() in self.days and day not in self.exceptions:
+                events = []
+                for start_time, end_time, order, period in self.days[day.weekday()][2]:
+                    for t, kind in ((start_time, "open"), (end_time, "close")):
+                        # localize per day so each boundary gets that day's UTC offset across DST changes
+                        when = self.tz.localize(datetime.combine(day, t)).astimezone(pytz.utc)
+                        if when > after:
+                            events.append((when, kind, period))
+                if events:
+                    first = min(e[0] for e in events)
+                    return first, [(kind, period) for when, kind, period in events if when == first]
+            day += timedelta(days=1)
+        return None
+
+class ScheduleIndex:
+    def __init__(self, classes):
+        self.by_id = {} # channel_id -> [CompiledClass], for classes configured with one; channel ids are unique across guilds
+        self.by_channel = {} # channel name -> [CompiledClass], for the rest; in config order
+        for cl in classes:
+            compiled = CompiledClass(cl)
+            if compiled.channel_id:
+                self.by_id.setdefault(compiled.channel_id, []).append(compiled)
+            else:
+                self.by_channel.setdefault(cl["channel"], []).append(compiled)
+
+    def compiled(self):
+        return [c for index in (self.by_id, self.by_channel) for group in index.values() for c in group]
+
+    def classes_for(self, channel: str, guild_id=None, channel_id=None):
+        by_id = self.by_id.get(channel_id)
+        if by_id:
+            return by_id
+        return [c for c in self.by_channel.get(channel, ()) if c.guild_id is None or c.guild_id == guild_id]
+
+    def get_period(self, channel: str, now=None, guild_id=None, channel_id=None): #if the period is active, it'll return the period, otherwise it'll return None
+        now = now or datetime.now(tz=pytz.utc)
+        for compiled in self.classes_for(channel, guild_id, channel_id):
+            period = compiled.period_at(now.astimezone(tz=compiled.tz))
+            if period is not None:
+                return period
+        return None
+
+    def busy(self, now=None): # is any class meeting right now
+        now = now or datetime.now(tz=pytz.utc)
+        return any(compiled.period_at(now.astimezone(compiled.tz)) is not None for compiled in self.compiled())
+
+class EventScheduler:
+    # Sleeps until the next period boundary across all classes (a heap with one entry per class),
+    # then dispatches that boundary's open/close events as concurrent tasks.
+    def __init__(self, index, on_open, on_close, max_sleep=3600):
+        self.index = index
+        self.on_open = on_open # async on_open(class_info, period)
+        self.on_close = on_close
+        self.max_sleep = max_sleep # wake up at least this often in case the wall clock jumped
+        self.heap = []
+        self.tasks = set()
+        self._seq = itertools.count()
+
+    def _push(self, compiled, after):
+        nxt = compiled.next_events(after)
+        if nxt:
+            heapq.heappush(self.heap, (nxt[0], next(self._seq), compiled, nxt[1]))
+
+    def _dispatch(self, compiled, kind, period):
+        handler = self.on_open if kind == "open" else self.on_close
+        task = asyncio.create_task(handler(compiled.info, period))
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Schedule event failed: {task.exception()!r}")
+
+    async def run(self):
+        now = datetime.now(tz=pytz.utc)
+        for compiled in self.index.compiled():
+            period = compiled.period_at(now.astimezone(compiled.tz))
+            if period is not None: # already running at startup: open it now, like the old polling loop did
+                self._dispatch(compiled, "open", period)
+            self._push(compiled, now)
+
+        while self.heap:
+            delay = (self.heap[0][0] - datetime.now(tz=pytz.utc)).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(min(delay, self.max_sleep))
+                continue
+            when, seq, compiled, events = heapq.heappop(self.heap)
+            for kind, period in events:
+                self._dispatch(compiled, kind, period)
+            self._push(compiled, when)
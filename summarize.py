@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import importlib.util
+import threading
+from collections import OrderedDict
+
+# Map-reduce summaries of poll responses. Responses are packed into chunks that fit a token budget,
+# each chunk is summarized concurrently (bounded by a semaphore), and the partial summaries are
+# merged with one more call. Every model call is cached by a hash of its prompt and has a hard
+# timeout. The model is anything with generate_content(prompt) -> object with .text, so a local
+# fake can stand in for google.generativeai.GenerativeModel.
+
+def gemini_available():
+    try:
+        return importlib.util.find_spec("google.generativeai") is not None
+    except ModuleNotFoundError: # no google namespace package at all
+        return False
+
+class GeminiModel: # google.generativeai is imported and configured on the first summary, not at startup
+    def __init__(self, api_key, name):
+        self.api_key = api_key
+        self.name = name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt): # called on worker threads, like the real model's
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.name)
+        return self._model.generate_content(prompt)
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+class Summarizer:
+    def __init__(self, model, run=asyncio.to_thread, chunk_tokens=6000, concurrency=4, timeout=30, deadline=90, cache_size=256):
+        self.model = model
+        self.run = run # runs the blocking generate_content call off the event loop
+        self.chunk_tokens = chunk_tokens
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout # per model call
+        self.deadline = deadline # for the whole summary
+        self.cache = OrderedDict() # sha256 of prompt -> text
+        self.cache_size = cache_size
+
+    async def _generate(self, prompt):
+        key = hashlib.sha256(prompt.encode()).hexdigest()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        async with self.semaphore:
+            response = await asyncio.wait_for(self.run(self.model.generate_content, prompt), self.timeout)
+        self.cache[key] = response.text
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return response.text
+
+    def chunks(self, responses):
+        chunk, size = [], 0
+        for r in responses:
+            line = f"- {r}"
+            tokens = estimate_tokens(line)
+            if chunk and size + tokens > self.chunk_tokens:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(line[:self.chunk_tokens * 4]) # a single huge response is truncated to fit
+            size += tokens
+        if chunk:
+            yield chunk
+
+    async def _summarize(self, question, responses):
+        chunks = list(self.chunks(responses))
+        if len(chunks) == 1:
+            return await self._generate(f"Summarize the following responses to the question: '{question}'\n\nResponses:\n" + "\n".join(chunks[0]))
+
+        partials = await asyncio.gather(*[self._generate(
+            f"Summarize the following responses to the question: '{question}'. This is part {i + 1} of {len(chunks)} of the responses.\n\nResponses:\n" + "\n".join(chunk))
+            for i, chunk in enumerate(chunks)], return_exceptions=True)
+        summaries = [p for p in partials if not isinstance(p, BaseException)]
+        if not summaries:
+            raise partials[0]
+        missing = len(partials) - len(summaries)
+
+        merged = await self._merge(question, summaries)
+        if missing:
+            merged += f"\n\n(Summary is missing {missing} of {len(partials)} groups of responses.)"
+        return merged
+
+    async def _merge(self, question, summaries): # reduce step; merges in groups again if they don't fit one prompt
+        groups = list(self.chunks(summaries))
+        if len(groups) >= len(summaries) > 1: # every summary is near the budget on its own: merge pairwise
+            groups = [["- " + s for s in summaries[i:i + 2]] for i in range(0, len(summaries), 2)]
+        merged = await asyncio.gather(*[self._generate(
+            f"The following are summaries of different groups of responses to the question: '{question}'. "
+            f"Combine them into a single summary.\n\nSummaries:\n" + "\n\n".join(group)) for group in groups])
+        return merged[0] if len(merged) == 1 else await self._merge(question, merged)
+
+    async def summarize(self, question, responses): #always returns text; falls back to a note on timeout or error
+        if not responses:
+            return "No responses were submitted."
+        try:
+            return await asyncio.wait_for(self._summarize(question, responses), self.deadline)
+        except asyncio.TimeoutError:
+            return f"Summary timed out. {len(responses)} responses were recorded; see the detailed responses file."
+        except Exception as e:
+            return f"Error generating summary: {e}"